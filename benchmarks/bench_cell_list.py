@@ -0,0 +1,123 @@
+"""
+Benchmarks for construction, insertion and queries of the cell list.
+
+Run with pytest-benchmark, e.g.:
+    pytest benchmarks/bench_cell_list.py --benchmark-json=benchmark_results.json
+"""
+
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import mbuild_cell_list as mbcl
+
+# number density of the random systems; with a cutoff of 1.0 this gives about 20 neighbors per member
+DENSITY = 5.0
+R_CUT = 1.0
+
+N_MEMBERS = [1000, 10000, 100000]
+N_CELLS = [10, 30, 60]
+PERIODICITY = {'TTT': [True, True, True], 'TTF': [True, True, False]}
+LIST_TYPES = ['full', 'half']
+
+
+def _random_system(n, seed=12345):
+    # n random positions in a cubic box of constant density
+    box_length = (n/DENSITY)**(1.0/3.0)
+    xyz = np.random.default_rng(seed).random((n, 3))*box_length
+    return [box_length]*3, xyz
+
+
+def _cell_list(n, periodicity='TTT', list_type='full'):
+    box, xyz = _random_system(n)
+    cell_list = mbcl.CellList.from_cutoff(box, r_cut=R_CUT, periodicity=PERIODICITY[periodicity], list_type=list_type)
+    cell_list.insert_positions(xyz)
+    return cell_list
+
+
+def _brute_force_pairs(xyz, box, periodicity, r_cut, chunk=256):
+    # O(N^2) minimum image search, in chunks of rows to limit memory
+    box = np.array(box)
+    periodicity = np.array(periodicity)
+    n_pairs = 0
+    for start in range(0, len(xyz), chunk):
+        delta = xyz[None, :, :] - xyz[start:start+chunk, None, :]
+        delta = np.where(periodicity, delta - box*np.round(delta/box), delta)
+        n_pairs += np.count_nonzero(np.einsum('ijk,ijk->ij', delta, delta) <= r_cut**2)
+    return n_pairs - len(xyz)
+
+
+def test_import_time(benchmark):
+    # importing the package in a fresh interpreter; mbuild should not be imported
+    benchmark.pedantic(subprocess.run, args=([sys.executable, '-c', 'import mbuild_cell_list'],),
+                       kwargs={'check': True}, rounds=5)
+
+
+@pytest.mark.parametrize('list_type', LIST_TYPES)
+@pytest.mark.parametrize('periodicity', PERIODICITY)
+@pytest.mark.parametrize('n_cells', N_CELLS)
+def test_construction(benchmark, n_cells, periodicity, list_type):
+    benchmark.extra_info['n_cells_total'] = n_cells**3
+    benchmark(mbcl.CellList, box=[float(n_cells)]*3, n_cells=[n_cells]*3, periodicity=PERIODICITY[periodicity],
+              list_type=list_type)
+
+
+@pytest.mark.parametrize('n', N_MEMBERS)
+def test_insert_positions(benchmark, n):
+    box, xyz = _random_system(n)
+    cell_list = mbcl.CellList.from_cutoff(box, r_cut=R_CUT)
+
+    def insert():
+        cell_list.empty_cells()
+        cell_list.insert_positions(xyz)
+        return cell_list.sorted_ids
+
+    benchmark(insert)
+
+
+@pytest.mark.parametrize('n', N_MEMBERS[:2])
+def test_insert_compound_particles(benchmark, n):
+    mb = pytest.importorskip('mbuild')
+    box, xyz = _random_system(n)
+    system = mb.Compound()
+    for pos in xyz:
+        system.add(mb.Compound(name='Ar', pos=pos))
+    cell_list = mbcl.CellList.from_cutoff(box, r_cut=R_CUT)
+
+    def insert():
+        cell_list.empty_cells()
+        cell_list.insert_compound_particles(system)
+        return cell_list.sorted_ids
+
+    benchmark(insert)
+
+
+@pytest.mark.parametrize('list_type', LIST_TYPES)
+@pytest.mark.parametrize('periodicity', PERIODICITY)
+@pytest.mark.parametrize('n', N_MEMBERS)
+def test_pairs_within(benchmark, n, periodicity, list_type):
+    cell_list = _cell_list(n, periodicity, list_type)
+    i, _, _ = benchmark(cell_list.pairs_within, R_CUT)
+    benchmark.extra_info['n_pairs'] = len(i)
+
+
+@pytest.mark.parametrize('list_type', LIST_TYPES)
+@pytest.mark.parametrize('n', N_MEMBERS[:2])
+def test_neighbor_members_and_min_image_shift(benchmark, n, list_type):
+    cell_list = _cell_list(n, list_type=list_type)
+
+    def query():
+        for c in range(cell_list.n_cells_total):
+            cell_list.neighbor_members_and_min_image_shift(c)
+
+    benchmark.pedantic(query, rounds=3)
+
+
+@pytest.mark.parametrize('n', N_MEMBERS[:2])
+def test_brute_force_baseline(benchmark, n):
+    # O(N^2) reference for the scaling of pairs_within
+    box, xyz = _random_system(n)
+    n_pairs = benchmark.pedantic(_brute_force_pairs, args=(xyz, box, [True, True, True], R_CUT), rounds=3)
+    benchmark.extra_info['n_pairs'] = n_pairs
@@ -2,6 +2,10 @@
 
 # Add imports here
 from .mbuild_cell_list import *
+from .verlet_list import *
+from .parallel import *
+from .multi_resolution import *
+from .compound_index import *
 
 
 from ._version import __version__
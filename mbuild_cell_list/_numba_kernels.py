@@ -0,0 +1,140 @@
+"""Compiled kernels used by the 'numba' backend of the CellList.
+
+Each kernel gives the same results, in the same order, as the NumPy code it replaces.
+This module requires numba; it is only imported when the 'numba' backend is requested.
+"""
+
+import numba
+import numpy as np
+
+
+@numba.njit(cache=True)
+def bin_positions(rel_xyz, factors, divide, limits, n_cells):
+    # cell of each position, where rel_xyz is the position relative to box_min (orthorhombic boxes,
+    # divided by the cell sizes) or the fractional position (triclinic boxes, multiplied by n_cells).
+    # Positions outside [0, limits] are flagged as outside and given a cell of -1.
+    n = rel_xyz.shape[0]
+    cells = np.empty(n, dtype=np.int64)
+    outside = np.zeros(n, dtype=np.bool_)
+    for p in range(n):
+        c = 0
+        stride = 1
+        for d in range(3):
+            x = rel_xyz[p, d]
+            if x < 0.0 or x > limits[d]:
+                outside[p] = True
+            if divide:
+                index = int(np.floor(x/factors[d]))
+            else:
+                index = int(np.floor(x*factors[d]))
+            # a point that sits exactly on the upper face of the box belongs to the last cell
+            if index > n_cells[d] - 1:
+                index = n_cells[d] - 1
+            c += index*stride
+            stride *= n_cells[d]
+        cells[p] = -1 if outside[p] else c
+    return cells, outside
+
+
+@numba.njit(cache=True)
+def counting_sort(cells, n_cells_total):
+    # stable counting sort of member ids by cell; members with a cell of -1 are dropped
+    count = np.zeros(n_cells_total, dtype=np.int64)
+    for c in cells:
+        if c >= 0:
+            count[c] += 1
+    start = np.empty(n_cells_total, dtype=np.int64)
+    total = 0
+    for c in range(n_cells_total):
+        start[c] = total
+        total += count[c]
+    fill = start.copy()
+    sorted_ids = np.empty(total, dtype=np.int64)
+    for i in range(len(cells)):
+        c = cells[i]
+        if c >= 0:
+            sorted_ids[fill[c]] = i
+            fill[c] += 1
+    return sorted_ids, count, start
+
+
+@numba.njit(cache=True)
+def _pairs_pass(cells, xyz, sorted_ids, cell_start, cell_count, neighbor_table, shift_table, box_matrix,
+                r_cut2, half, write, out_i, out_j, out_vectors):
+    # count (write=False) or store (write=True) the pairs within the cutoff for the given cells
+    k = 0
+    image = np.empty(3)
+    vector = np.empty(3)
+    n_stencil = neighbor_table.shape[1]
+    for c in cells:
+        start = cell_start[c]
+        count = cell_count[c]
+
+        # pairs within the cell itself
+        for a in range(count):
+            ia = sorted_ids[start+a]
+            first = a + 1 if half else 0
+            for b in range(first, count):
+                if b == a:
+                    continue
+                ib = sorted_ids[start+b]
+                d2 = 0.0
+                for d in range(3):
+                    vector[d] = xyz[ib, d] - xyz[ia, d]
+                    d2 += vector[d]*vector[d]
+                if d2 <= r_cut2:
+                    if write:
+                        out_i[k] = ia
+                        out_j[k] = ib
+                        out_vectors[k] = vector
+                    k += 1
+
+        # pairs with the shifted images of the members of the neighboring cells
+        for a in range(count):
+            ia = sorted_ids[start+a]
+            for s in range(n_stencil):
+                neighbor = neighbor_table[c, s]
+                if neighbor < 0:
+                    continue
+                for d in range(3):
+                    image[d] = 0.0
+                    for e in range(3):
+                        image[d] += shift_table[c, s, e]*box_matrix[e, d]
+                neighbor_start = cell_start[neighbor]
+                for b in range(cell_count[neighbor]):
+                    ib = sorted_ids[neighbor_start+b]
+                    d2 = 0.0
+                    for d in range(3):
+                        vector[d] = (xyz[ib, d] + image[d]) - xyz[ia, d]
+                        d2 += vector[d]*vector[d]
+                    if d2 <= r_cut2:
+                        if write:
+                            out_i[k] = ia
+                            out_j[k] = ib
+                            out_vectors[k] = vector
+                        k += 1
+    return k
+
+
+def pairs_in_cells(cells, xyz, sorted_ids, cell_start, cell_count, neighbor_table, shift_table, box_matrix,
+                   r_cut, half):
+    # compiled equivalent of mbuild_cell_list._pairs_in_cells
+    cells = np.ascontiguousarray(cells, dtype=np.int64)
+    xyz = np.ascontiguousarray(xyz, dtype=np.float64)
+    sorted_ids = np.ascontiguousarray(sorted_ids, dtype=np.int64)
+    cell_start = np.ascontiguousarray(cell_start, dtype=np.int64)
+    cell_count = np.ascontiguousarray(cell_count, dtype=np.int64)
+    box_matrix = np.ascontiguousarray(box_matrix, dtype=np.float64)
+    half = bool(half)
+    r_cut2 = float(r_cut)**2
+
+    empty_i = np.empty(0, dtype=np.int64)
+    empty_vectors = np.empty((0, 3), dtype=np.float64)
+    n_pairs = _pairs_pass(cells, xyz, sorted_ids, cell_start, cell_count, neighbor_table, shift_table, box_matrix,
+                          r_cut2, half, False, empty_i, empty_i, empty_vectors)
+    i = np.empty(n_pairs, dtype=np.int64)
+    j = np.empty(n_pairs, dtype=np.int64)
+    vectors = np.empty((n_pairs, 3), dtype=np.float64)
+    _pairs_pass(cells, xyz, sorted_ids, cell_start, cell_count, neighbor_table, shift_table, box_matrix,
+                r_cut2, half, True, i, j, vectors)
+    return i, j, np.linalg.norm(vectors, axis=1), vectors
@@ -0,0 +1,269 @@
+"""Two-level index of mbuild Compounds and their particles."""
+
+
+__all__ = ["CompoundIndex"]
+
+import numpy as np
+
+from .mbuild_cell_list import _ragged_arange
+from .multi_resolution import MultiResolutionCellList
+
+
+class CompoundIndex():
+    """Two-level index of mbuild Compounds (e.g., molecules) and their particles.
+    The Compounds are binned by their center, with a cached bounding radius, in a MultiResolutionCellList,
+    and the particles of each Compound are stored contiguously in a child index. Particle-level queries
+    first find the pairs of Compounds whose bounding spheres are within the cutoff, and then only compare
+    the particles of each such pair that are within reach of the bounding sphere of the other Compound,
+    so the particles of Compounds that are far apart are never compared.
+    """
+    def __init__(self, box, r_cut, level_radii, periodicity=[True,True,True], box_min=[0.0,0.0,0.0], **kwargs):
+        """Initialize an empty index.
+
+        Parameters
+        ----------
+        box : list, length=3, dtype=float or mb.Box
+            Either an mBuild Box or list of length=3 representing box lengths
+        r_cut : float
+            The cutoff distance between particles of different Compounds.
+        level_radii : list, dtype=float
+            The largest bounding radius of the Compounds in each level of the Compound index,
+            in increasing order (see MultiResolutionCellList); a single level is enough if the Compounds
+            are of similar size.
+        periodicity, list, length=3, type=bool, default=[True,True,True]
+            Periodicity in each box dimensions
+        box_min, list, length=3, dtype=float, default=[0.0,0.0,0.0]
+            Minimum position of the box.
+        **kwargs
+            Additional keyword arguments passed to the CellList of each level (e.g., backend).
+
+        Returns
+        ------
+        """
+        self._r_cut = r_cut
+        self._compounds = MultiResolutionCellList(box, r_cut, level_radii, periodicity=periodicity, box_min=box_min,
+                                                  **kwargs)
+
+        # the particles of each Compound are stored contiguously: the particles of compound c are
+        # particle ids particle_start[c] to particle_start[c]+particle_count[c]
+        self._particle_xyz = np.empty((0, 3), dtype=float)
+        self._particle_compound = np.empty(0, dtype=int)
+        self._particle_start = np.empty(0, dtype=int)
+        self._particle_count = np.empty(0, dtype=int)
+        self._particles = []
+
+    def insert_compounds(self, compounds, wrap_pbc=False):
+        """Insert mbuild Compounds, along with their particles.
+
+        Parameters
+        ----------
+        compounds : list of mb.Compound
+            The Compounds to insert.
+        wrap_pbc : bool, default=False
+            If True, Compound centers outside of the box bounds will be wrapped to the other side based on
+            defined periodicity; the particles are moved along with the center of their Compound.
+
+        Returns
+        ------
+        compound_ids : np.ndarray, shape=(N), dtype=int
+            The compound id of each Compound.
+        """
+        compounds = list(compounds)
+        centers = np.array([compound.pos for compound in compounds], dtype=float).reshape(-1, 3)
+        xyz = [np.asarray(compound.xyz, dtype=float).reshape(-1, 3) for compound in compounds]
+        compound_ids = self._compounds.insert_compounds(compounds, wrap_pbc=wrap_pbc)
+
+        # keep the particles next to their (possibly wrapped) center
+        offsets = self._compounds.xyz[compound_ids] - centers
+        counts = np.array([len(particle_xyz) for particle_xyz in xyz], dtype=int)
+        self._particle_start = np.concatenate([self._particle_start, len(self._particle_compound)
+                                               + np.cumsum(counts) - counts])
+        self._particle_count = np.concatenate([self._particle_count, counts])
+        self._particle_compound = np.concatenate([self._particle_compound, np.repeat(compound_ids, counts)])
+        if len(xyz):
+            self._particle_xyz = np.concatenate([self._particle_xyz, np.concatenate(xyz)
+                                                 + np.repeat(offsets, counts, axis=0)])
+        for compound in compounds:
+            self._particles.extend(compound.particles())
+        return compound_ids
+
+    def _minimum_image(self, vectors):
+        return self._compounds.levels[0]._minimum_image(vectors)
+
+    def _reaching(self, compounds, others):
+        # the particles of each compound that are within r_cut of the bounding sphere of the other compound
+        # of the pair, as the particle ids and the index of the pair they belong to
+        counts = self._particle_count[compounds]
+        ids = _ragged_arange(self._particle_start[compounds], counts)
+        pair = np.repeat(np.arange(len(compounds)), counts)
+        centers = self._compounds.xyz[others[pair]]
+        distance = np.linalg.norm(self._minimum_image(self._particle_xyz[ids] - centers), axis=1)
+        reach = distance <= self._compounds.radii[others[pair]] + self._r_cut
+        return ids[reach], pair[reach]
+
+    def _particle_pairs(self, a, b, chunk=4096):
+        # particle pairs within r_cut between compounds a[k] and b[k], for each pair k
+        i_list, j_list, distance_list = [], [], []
+        for start in range(0, len(a), chunk):
+            ca, cb = a[start:start+chunk], b[start:start+chunk]
+            ids_a, pair_a = self._reaching(ca, cb)
+            ids_b, pair_b = self._reaching(cb, ca)
+            count_b = np.bincount(pair_b, minlength=len(ca))
+            start_b = np.cumsum(count_b) - count_b
+
+            # every reaching particle of a against every reaching particle of b in the same pair
+            i = np.repeat(ids_a, count_b[pair_a])
+            j = ids_b[_ragged_arange(start_b[pair_a], count_b[pair_a])]
+            distance = np.linalg.norm(self._minimum_image(self._particle_xyz[j] - self._particle_xyz[i]), axis=1)
+            within = distance <= self._r_cut
+            i_list.append(i[within])
+            j_list.append(j[within])
+            distance_list.append(distance[within])
+
+        if not i_list:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty(0, dtype=float)
+        return np.concatenate(i_list), np.concatenate(j_list), np.concatenate(distance_list)
+
+    def compound_pairs(self):
+        """Find the pairs of Compounds whose bounding spheres are within r_cut of each other.
+        These are the only Compounds that can have particles within r_cut of each other.
+
+        Returns
+        ------
+        i : np.ndarray, shape=(n_pairs), dtype=int
+            The compound id of the first Compound of each pair.
+        j : np.ndarray, shape=(n_pairs), dtype=int
+            The compound id of the second Compound of each pair.
+        distance : np.ndarray, shape=(n_pairs), dtype=float
+            The distance between the centers of the Compounds of each pair.
+        """
+        return self._compounds.contacts()
+
+    def particle_pairs(self):
+        """Find all pairs of particles, in different Compounds, that are within r_cut of each other.
+        Each pair is reported once.
+
+        Returns
+        ------
+        i : np.ndarray, shape=(n_pairs), dtype=int
+            The particle id of the first particle of each pair.
+        j : np.ndarray, shape=(n_pairs), dtype=int
+            The particle id of the second particle of each pair.
+        distance : np.ndarray, shape=(n_pairs), dtype=float
+            The distance between the particles of each pair.
+        """
+        a, b, _ = self._compounds.contacts()
+        return self._particle_pairs(a, b)
+
+    def particle_neighbors(self, compound_id):
+        """Find the particles of other Compounds that are within r_cut of the particles of a Compound.
+
+        Parameters
+        ----------
+        compound_id : int
+            The compound id of the Compound of interest.
+
+        Returns
+        ------
+        i : np.ndarray, shape=(n_pairs), dtype=int
+            The particle id of the particle of the Compound of interest.
+        j : np.ndarray, shape=(n_pairs), dtype=int
+            The particle id of the particle of the other Compound.
+        distance : np.ndarray, shape=(n_pairs), dtype=float
+            The distance between the particles of each pair.
+        """
+        center = self._compounds.xyz[compound_id]
+        others, _ = self._compounds.neighbors(center, radius=self._compounds.radii[compound_id])
+        others = others[others != compound_id]
+        return self._particle_pairs(np.full(len(others), compound_id), others)
+
+    def get_particles(self, ids):
+        """Returns the particles that correspond to a set of particle ids.
+
+        Parameters
+        ----------
+        ids : array-like, dtype=int
+            Particle ids, e.g., as returned by particle_pairs.
+
+        Returns
+        ------
+        particles : list
+            The particle for each id.
+        """
+        return [self._particles[i] for i in np.asarray(ids, dtype=int).ravel().tolist()]
+
+    def get_compounds(self, ids):
+        """Returns the Compounds that correspond to a set of compound ids.
+
+        Parameters
+        ----------
+        ids : array-like, dtype=int
+            Compound ids, e.g., as returned by compound_pairs.
+
+        Returns
+        ------
+        compounds : list
+            The Compound for each id.
+        """
+        return self._compounds.get_members(ids)
+
+    @property
+    def compounds(self):
+        """Returns the index of the Compounds.
+        Returns
+        ------
+        compounds : MultiResolutionCellList
+            The Compounds binned by their center, with their bounding radii.
+        """
+        return self._compounds
+
+    @property
+    def particle_xyz(self):
+        """Returns the positions of the particles.
+        Returns
+        ------
+        particle_xyz : np.array, shape=(n_particles, 3), dtype=float
+            The position of each particle, in particle id order; particles are moved along with
+            the center of their Compound if it was wrapped.
+        """
+        return self._particle_xyz
+
+    @property
+    def particle_compound(self):
+        """Returns the Compound of each particle.
+        Returns
+        ------
+        particle_compound : np.array, shape=(n_particles), dtype=int
+            The compound id of the Compound that contains each particle.
+        """
+        return self._particle_compound
+
+    @property
+    def r_cut(self):
+        """Returns the particle cutoff distance.
+        Returns
+        ------
+        r_cut : float
+            The cutoff distance between particles of different Compounds.
+        """
+        return self._r_cut
+
+    @property
+    def n_compounds(self):
+        """Returns the number of Compounds.
+        Returns
+        ------
+        n_compounds : int
+            The number of Compounds in the index.
+        """
+        return self._compounds.n_members
+
+    @property
+    def n_particles(self):
+        """Returns the number of particles.
+        Returns
+        ------
+        n_particles : int
+            The number of particles of all Compounds in the index.
+        """
+        return len(self._particle_compound)
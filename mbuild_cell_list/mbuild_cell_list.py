@@ -3,58 +3,300 @@
 
 __all__ = ["CellList"]
 
-import mbuild as mb
+import functools
+import json
+import os
+import sys
+import time
+import warnings
+
 import numpy as np
 
 
+def _mbuild():
+    # mbuild is only imported when it is needed (e.g., to create an mb.Box),
+    # so that the cell list itself can be used with just NumPy
+    import mbuild
+    return mbuild
+
+
+def _is_mbuild(obj, name):
+    # check if obj is an mbuild Box or Compound without importing mbuild;
+    # if mbuild has not been imported, obj cannot be an instance of its classes
+    mbuild = sys.modules.get('mbuild')
+    return mbuild is not None and isinstance(obj, getattr(mbuild, name))
+
+
+def _ragged_arange(starts, counts):
+    # concatenation of np.arange(start, start+count) for each start/count pair
+    counts = np.asarray(counts, dtype=int)
+    total = counts.sum()
+    if total == 0:
+        return np.empty(0, dtype=int)
+    offsets = np.asarray(starts, dtype=int) - (np.cumsum(counts) - counts)
+    return np.arange(total) + np.repeat(offsets, counts)
+
+
+def _box_matrix(lengths, angles):
+    # box vectors (as rows) for a box with the given lengths and angles (in degrees),
+    # with the first vector along x and the second in the xy plane
+    a, b, c = lengths
+    alpha, beta, gamma = np.radians(angles)
+    cos_alpha, cos_beta, cos_gamma = np.cos([alpha, beta, gamma])
+    sin_gamma = np.sin(gamma)
+    c_x = c*cos_beta
+    c_y = c*(cos_alpha - cos_beta*cos_gamma)/sin_gamma
+    return np.array([[a, 0.0, 0.0],
+                     [b*cos_gamma, b*sin_gamma, 0.0],
+                     [c_x, c_y, np.sqrt(c**2 - c_x**2 - c_y**2)]])
+
+
+def _perpendicular_widths(box_matrix):
+    # distance between opposite faces of the box, for each box vector
+    return 1.0/np.linalg.norm(np.linalg.inv(box_matrix), axis=0)
+
+
+def _backend_kernels(backend):
+    # the compiled kernels used by the 'numba' backend, or None for the NumPy backend;
+    # numba is only imported when it is asked for, and falls back to NumPy if it is missing
+    if backend == 'numpy':
+        return None
+    if backend != 'numba':
+        raise Exception(f'Unknown backend: {backend}. Options are \'numpy\' or \'numba\'.')
+    try:
+        from . import _numba_kernels
+    except ImportError:
+        warnings.warn('numba is not installed; falling back to the numpy backend.')
+        return None
+    return _numba_kernels
+
+
+# the methods that are timed when profiling is enabled
+_PROFILED_METHODS = ['_init_grid', '_build_csr', 'wrap_positions', 'cells_containing', 'insert_members',
+                     'insert_positions', 'insert_compound_particles', 'insert_compound_position', 'update_positions',
+                     'remove', 'move', 'members', 'neighbor_members', 'neighbor_members_and_min_image_shift',
+                     'pairs_within']
+
+
+def _timed(method, timings):
+    # wrap a bound method so that the number of calls and the total time spent in it are recorded
+    counter = timings.setdefault(method.__name__, {'calls': 0, 'time': 0.0})
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            counter['calls'] += 1
+            counter['time'] += time.perf_counter() - start
+    return wrapper
+
+
+# offsets to a cell and each of its 26 neighbors, with the cell itself first
+_POINT_OFFSETS = np.array([[0, 0, 0]] + [[x, y, z] for z in range(-1, 2) for y in range(-1, 2) for x in range(-1, 2)
+                                         if (x, y, z) != (0, 0, 0)], dtype=int)
+
+# the version of the format written by CellList.save
+_SAVE_FORMAT = 1
+
+# the arrays written by CellList.save, each to its own .npy file so that they can be memory mapped
+_SAVED_ARRAYS = ['_stencil', '_neighbor_table', '_shift_table', '_member_cells', '_member_xyz', '_sorted_ids',
+                 '_cell_start', '_cell_count']
+
+# the arrays written by CellList.save for a sparse cell list, which has no per-cell tables
+_SPARSE_SAVED_ARRAYS = ['_stencil', '_occupied', '_member_cells', '_member_xyz', '_sorted_ids', '_cell_start',
+                        '_cell_count']
+
+
+def _pairs_in_cells(cells, xyz, sorted_ids, cell_start, cell_count, neighbor_table, shift_table, box_matrix,
+                    r_cut, half, batch_size=1 << 18):
+    # find the pairs within r_cut for the members of the given cells: the members of each cell are compared
+    # with each other and with the shifted images of the members of the neighboring cells.
+    # The cells are handled in batches of roughly batch_size candidate pairs, so the work is done
+    # in a few large NumPy operations rather than one small operation per cell.
+    cells = np.asarray(cells, dtype=int)
+    cells = cells[cell_count[cells] > 0]
+    counts = cell_count[cells]
+    neighbors = neighbor_table[cells]
+    valid = neighbors >= 0
+    neighbor_counts = np.where(valid, cell_count[neighbors], 0).sum(axis=1)
+    intra_counts = counts*(counts-1)//2 if half else counts*(counts-1)
+    n_candidates = intra_counts + counts*neighbor_counts
+    batches = (np.cumsum(n_candidates) - n_candidates)//batch_size
+    edges = np.flatnonzero(np.diff(batches)) + 1
+
+    i_list, j_list, vector_list = [], [], []
+    for batch in np.split(np.arange(len(cells)), edges):
+        if len(batch) == 0:
+            continue
+        i, j, vectors = _pairs_in_batch(cells[batch], neighbors[batch], valid[batch], xyz, sorted_ids, cell_start,
+                                        cell_count, shift_table, box_matrix, r_cut**2, half)
+        i_list.append(i)
+        j_list.append(j)
+        vector_list.append(vectors)
+
+    if i_list:
+        i = np.concatenate(i_list).astype(int)
+        j = np.concatenate(j_list).astype(int)
+        vectors = np.concatenate(vector_list)
+    else:
+        i = np.empty(0, dtype=int)
+        j = np.empty(0, dtype=int)
+        vectors = np.empty((0, 3), dtype=float)
+    return i, j, np.linalg.norm(vectors, axis=1), vectors
+
+
+def _pairs_in_batch(cells, neighbors, valid, xyz, sorted_ids, cell_start, cell_count, shift_table, box_matrix,
+                    r_cut2, half):
+    # the pairs within the cutoff for a batch of occupied cells, ordered as if the cells were handled one at
+    # a time: for each cell, the pairs within the cell and then the pairs with the members of its neighbors,
+    # each ordered by the member of the cell
+    n_cells = len(cells)
+    counts = cell_count[cells]
+    ids = sorted_ids[_ragged_arange(cell_start[cells], counts)]
+    member_cell = np.repeat(np.arange(n_cells), counts)
+    first = np.cumsum(counts) - counts
+    member = np.arange(len(ids))
+    cell_xyz = xyz[ids]
+
+    # pairs within each cell, as indices into ids
+    if half:
+        n_partners = first[member_cell] + counts[member_cell] - member - 1
+        a = np.repeat(member, n_partners)
+        b = _ragged_arange(member + 1, n_partners)
+    else:
+        n_partners = counts[member_cell]
+        a = np.repeat(member, n_partners)
+        b = _ragged_arange(first[member_cell], n_partners)
+        a, b = a[a != b], b[a != b]
+    a, b = _within(cell_xyz, cell_xyz, a, b, r_cut2)
+    intra = (ids[a], ids[b], cell_xyz[b] - cell_xyz[a], member_cell[a])
+
+    # pairs with the shifted images of the members of the neighboring cells; b indexes the
+    # concatenated members of the neighbors of all cells, which are grouped by cell
+    rows, columns = np.nonzero(valid)
+    neighbor_cells = neighbors[rows, columns]
+    neighbor_counts = cell_count[neighbor_cells]
+    neighbor_ids = sorted_ids[_ragged_arange(cell_start[neighbor_cells], neighbor_counts)]
+    images = np.repeat(shift_table[cells[rows], columns] @ box_matrix, neighbor_counts, axis=0)
+    neighbor_xyz = xyz[neighbor_ids] + images
+    n_neighbors = np.bincount(rows, weights=neighbor_counts, minlength=n_cells).astype(int)
+    neighbor_first = np.cumsum(n_neighbors) - n_neighbors
+    a = np.repeat(member, n_neighbors[member_cell])
+    b = _ragged_arange(neighbor_first[member_cell], n_neighbors[member_cell])
+    a, b = _within(cell_xyz, neighbor_xyz, a, b, r_cut2)
+    inter = (ids[a], neighbor_ids[b], neighbor_xyz[b] - cell_xyz[a], member_cell[a])
+
+    # interleave the two sets of pairs by cell
+    n_intra = np.bincount(intra[3], minlength=n_cells)
+    n_inter = np.bincount(inter[3], minlength=n_cells)
+    out_first = np.cumsum(n_intra + n_inter) - n_intra - n_inter
+    order = np.empty(len(intra[0]) + len(inter[0]), dtype=int)
+    order[out_first[intra[3]] + np.arange(len(intra[0])) - (np.cumsum(n_intra) - n_intra)[intra[3]]] = \
+        np.arange(len(intra[0]))
+    order[out_first[inter[3]] + n_intra[inter[3]] + np.arange(len(inter[0]))
+          - (np.cumsum(n_inter) - n_inter)[inter[3]]] = np.arange(len(inter[0])) + len(intra[0])
+    i = np.concatenate([intra[0], inter[0]])[order]
+    j = np.concatenate([intra[1], inter[1]])[order]
+    vectors = np.concatenate([intra[2], inter[2]])[order]
+    return i, j, vectors
+
+
+def _within(xyz_a, xyz_b, a, b, r_cut2):
+    # the candidate pairs (a, b) for which xyz_b[b] is within the cutoff of xyz_a[a];
+    # the squared distance is accumulated one dimension at a time to avoid gathering whole rows
+    d2 = np.zeros(len(a))
+    for x_a, x_b in zip(np.ascontiguousarray(xyz_a.T), np.ascontiguousarray(xyz_b.T)):
+        delta = x_b[b] - x_a[a]
+        d2 += delta*delta
+    within = d2 <= r_cut2
+    return a[within], b[within]
+
+
 class Cell():
     """
     A generic container to hold the relevant
     data for each cell in the cell list.
-    
+
+    The members and the grid topology are stored by the CellList in compact arrays;
+    the Cell provides a view of the data for a single cell.
     """
-    def __init__(self):
-        self._neighbor_cells = []
-        self._members = []
-        self._neighbor_members = []
-        self._pos = np.array([0.0,0.0,0.0])
-        self._neighbor_cells_shift = {}
-        self._ghost_cells = []
+    def __init__(self, cell_list, index):
+        self._cell_list = cell_list
+        self._index = index
         
     @property
     def members(self):
         """Returns a list of all members in a cell."""
-        return self._members
+        return self._cell_list.members(self._index)
     
     @property
     def pos(self):
         """Returns the center of the cell as a numpy array."""
-        return self._pos
+        return self._cell_list._cell_centers(np.array([self._index]))[0]
 
     @property
     def neighbor_cells(self):
         """Returns a list of all cells that are neighbors of the current cell."""
-        return self._neighbor_cells
+        return self._cell_list._neighbor_row(self._index)[0].tolist()
         
     @property
     def neighbor_members(self):
-        """Returns a list of all members of the cell and neighboring cells."""
-        return self._neighbor_members
+        """Returns a list of (member, cell) tuples for all members of the neighboring cells,
+        where cell is the index of the neighboring cell that holds the member."""
+        objects = self._cell_list._objects()
+        ids, source_cells, _ = self._cell_list._neighbor_member_ids(self._index)
+        return [(objects[i], c) for i, c in zip(ids.tolist(), source_cells.tolist())]
         
     @property
     def neighbor_cells_shift(self):
         """Returns a dictionary that defines how to shift the contents of a neighboring cell
         that exists across a periodic boundary, relative to this cell. The key of the dictionary
         corresponds to the numerical index of the neighboring cell."""
-        return self._neighbor_cells_shift
+        neighbor_cells, shifts = self._cell_list._neighbor_row(self._index)
+        return dict(zip(neighbor_cells.tolist(), shifts.tolist()))
+
+
+class _CellSequence():
+    # read-only sequence of Cell views, created on access
+    def __init__(self, cell_list):
+        self._cell_list = cell_list
+
+    def __len__(self):
+        return int(self._cell_list._n_cells_total)
+
+    def __getitem__(self, c):
+        n_cells_total = len(self)
+        if isinstance(c, slice):
+            return [Cell(self._cell_list, i) for i in range(*c.indices(n_cells_total))]
+        if not isinstance(c, (int, np.integer)):
+            raise TypeError(f'Cells are indexed by an integer or a slice, not {type(c).__name__}.')
+        if c < 0:
+            c += n_cells_total
+        if not 0 <= c < n_cells_total:
+            raise IndexError(f'Cell {c} is outside the bounds of the cell list.')
+        return Cell(self._cell_list, int(c))
+
+    def __iter__(self):
+        for c in range(len(self)):
+            yield Cell(self._cell_list, c)
 
 
 class CellList():
     """Cell list compatible with mbuild Compounds.
     The cell list can be constructed based on either the center of mass of a Compound
     or based on the position of the particles contained within a Compound.
+
+    Triclinic boxes (i.e., an mb.Box with angles other than 90 degrees) are supported by binning
+    in fractional coordinates; the cells are then parallelepipeds along the box vectors, and the
+    minimum image shifts of neighboring cells are in units of the box vectors rather than box lengths.
+
+    mbuild is only imported when it is needed; a cell list initialized from a list of box lengths
+    and populated with insert_positions or insert_members only requires NumPy.
     """
-    def __init__(self, box, n_cells=[3,3,3], periodicity=[True,True,True], box_min=[0.0,0.0,0.0], list_type='full'):
+    def __init__(self, box, n_cells=[3,3,3], periodicity=[True,True,True], box_min=[0.0,0.0,0.0], list_type='full',
+                 cache_neighbors=False, backend='numpy', profile=False, sparse=False):
         """Initialize the cell list.
         Note by default this will initialize the full cell list where each cell has 26 neighbors when fully periodic.
 
@@ -63,24 +305,63 @@ class CellList():
         box : list, length=3, dtype=float or mb.Box
             Either an mBuild Box or list of length=3 representing box lengths
         n_cells : list, length=3, dtype=int, default=[3,3,3]
-            Number of cells in x,y,z dimensions, must be greater than 3
+            Number of cells in x,y,z dimensions (along each box vector for a triclinic box), must be greater than 3
         periodicity, list, length=3, type=bool, default=[True,True,True]
             Periodicity in each box dimensions
         box_min, list, length=3, dtype=float, default=[0.0,0.0,0.0]
             Minimum position of the box.
         list_type, str, default='full'
             The type of cell list to initialize. Options are 'full' or 'half'.
+        cache_neighbors, bool, default=False
+            If True, the neighbor members of a cell are memoized the first time they are queried.
+            The cached values are invalidated when members are inserted or the cells are emptied.
+        backend, str, default='numpy'
+            The implementation used for binning, sorting members by cell and finding pairs.
+            Options are 'numpy' or 'numba'; 'numba' uses JIT-compiled kernels and falls back to
+            'numpy' (with a warning) if numba is not installed. Both give identical results.
+        profile, bool, default=False
+            If True, enable profiling (see enable_profiling) before the cell grid is constructed.
+        sparse, bool, default=False
+            If True, only the cells that hold members are stored, so memory scales with the number of occupied
+            cells rather than n_cells_total; this is useful for fine grids of mostly empty boxes (e.g., slabs
+            with vacuum). The neighbor and shift tables are not built; the neighbors of a cell are computed
+            from its index when needed, and cell_start and cell_count are indexed by position in occupied_cells.
 
 
         Returns
         ------
         """
-        if isinstance(box, mb.Box):
+        # the lengths and angles of the box are stored so that mbuild is not needed;
+        # an mb.Box is only created if one is asked for (see the box property)
+        if _is_mbuild(box, 'Box'):
             self._box = box
+            self._box_lengths = np.array(box.lengths, dtype=float)
+            self._box_angles = np.array(box.angles, dtype=float)
         else:
             assert len(box) == 3
-            self._box = mb.Box(box)
+            self._box = None
+            self._box_lengths = np.array(box, dtype=float)
+            self._box_angles = np.array([90.0, 90.0, 90.0])
+        if (self._box_lengths <= 0).any():
+            raise Exception(f'The box lengths must be positive, found: {self._box_lengths}')
+        self._init_geometry(n_cells, periodicity, box_min)
+        self._sparse = bool(sparse)
+
+        self._timings = {}
+        if profile:
+            self.enable_profiling()
+
+        if list_type == 'full':
+            self._init_grid(half=False)
+        elif list_type == 'half':
+            self._init_grid(half=True)
+        else:
+            raise Exception(f'Unknown cell list type: {list_type}')
+        self._init_settings(list_type, cache_neighbors, backend)
+        self._init_member_storage()
 
+    def _init_geometry(self, n_cells, periodicity, box_min):
+        # set up the box vectors and cell sizes, given the box lengths and angles
         self._n_cells = np.array(n_cells,dtype=int)
         self._n_cells_total = np.prod(self._n_cells)
         
@@ -89,143 +370,499 @@ class CellList():
             raise Exception(f'The CellList must have at least 3 cells in each dimension, found: {n_cells}')
         
         self._box_min = np.array(box_min)
-        
-        self._cell_sizes = np.array(self._box.lengths)/self._n_cells
-        
-        self.cells = []
-        self._periodicity = np.array(periodicity)
 
-        if list_type == 'full':
-            self._init_full()
-        elif list_type == 'half':
-            self._init_half()
+        # the box vectors are used for everything except orthorhombic boxes, for which
+        # the box lengths are used directly
+        self._orthorhombic = np.allclose(self._box_angles, 90.0)
+        if self._orthorhombic:
+            self._box_matrix = np.diag(self._box_lengths)
         else:
-            raise Exception(f'Unknown cell list type: {list_type}')
+            self._box_matrix = _box_matrix(self._box_lengths, self._box_angles)
+        self._box_matrix_inv = np.linalg.inv(self._box_matrix)
+
+        self._cell_sizes = self._box_lengths/self._n_cells
+        self._cell_widths = _perpendicular_widths(self._box_matrix)/self._n_cells
+        
+        self._periodicity = np.array(periodicity, dtype=bool)
+
+    def _init_settings(self, list_type, cache_neighbors, backend):
+        # options that do not depend on the grid or the members
+        self._list_type = list_type
+        self.cells = _CellSequence(self)
         self._from_particles = False
         self._from_com = False
+        self._cache_neighbors = cache_neighbors
+        self._kernels = _backend_kernels(backend)
+        self._backend = 'numpy' if self._kernels is None else 'numba'
+
+    @classmethod
+    def from_cutoff(cls, box, r_cut, periodicity=[True,True,True], box_min=[0.0,0.0,0.0], list_type='full',
+                    target_occupancy=None, n_members=None, **kwargs):
+        """Initialize a cell list with the number of cells chosen based on an interaction cutoff.
+        In each dimension the largest number of cells is used such that the cells are no smaller than the cutoff
+        (for a triclinic box, the perpendicular width of the cells), which ensures that all pairs within the cutoff
+        are found in neighboring cells.
+
+        Parameters
+        ----------
+        box : list, length=3, dtype=float or mb.Box
+            Either an mBuild Box or list of length=3 representing box lengths
+        r_cut : float
+            The interaction cutoff.
+        periodicity, list, length=3, type=bool, default=[True,True,True]
+            Periodicity in each box dimensions
+        box_min, list, length=3, dtype=float, default=[0.0,0.0,0.0]
+            Minimum position of the box.
+        list_type, str, default='full'
+            The type of cell list to initialize. Options are 'full' or 'half'.
+        target_occupancy, float, optional
+            If provided (n_members is then required), use fewer (larger) cells so that each cell holds
+            roughly this many members on average. Cells are never made smaller than the cutoff.
+        n_members, int, optional
+            The number of members expected to be inserted; used with target_occupancy.
+        **kwargs
+            Additional keyword arguments passed to the CellList constructor.
+
+        Returns
+        ------
+        cell_list : CellList
+            The initialized cell list.
+        """
+        is_box = _is_mbuild(box, 'Box')
+        if is_box and not np.allclose(box.angles, 90.0):
+            box_widths = _perpendicular_widths(_box_matrix(box.lengths, box.angles))
+        else:
+            box_widths = np.array(box.lengths if is_box else box, dtype=float)
+        if r_cut <= 0:
+            raise Exception(f'The cutoff must be positive, found: {r_cut}')
+
+        if target_occupancy is not None and n_members is None:
+            raise Exception('n_members (the number of members expected) is required to use target_occupancy.')
+
+        n_cells = np.floor(box_widths/r_cut).astype(int)
+        if target_occupancy is not None:
+            # scale the number of cells down equally in each direction to reach the target occupancy
+            n_cells_target = max(n_members/target_occupancy, 1.0)
+            if n_cells_target < np.prod(n_cells):
+                scale = (n_cells_target/np.prod(n_cells))**(1.0/3.0)
+                n_cells = np.minimum(np.maximum(np.floor(n_cells*scale), 3), n_cells).astype(int)
+
+        too_small = n_cells < 3
+        if too_small.any():
+            warnings.warn(f'The box is too small to fit 3 cells of size {r_cut} in dimension(s) '
+                          f'{np.nonzero(too_small)[0].tolist()}; falling back to 3 cells, which are smaller '
+                          f'than the cutoff, so pairs within the cutoff may be missed in these dimension(s).')
+            n_cells[too_small] = 3
+
+        return cls(box, n_cells=n_cells.tolist(), periodicity=periodicity, box_min=box_min, list_type=list_type,
+                   **kwargs)
+
+    def _init_member_storage(self):
+        # members are held in insertion order (the member id) along with the cell they belong to.
+        # For queries, the member ids are sorted by cell in CSR style: the members of cell c are
+        # sorted_ids[cell_start[c]:cell_start[c]+cell_count[c]]. The sorted layout is rebuilt lazily
+        # the first time it is needed after an insertion.
+        # Small insertions after the layout is built are held in a per-cell pending list instead,
+        # so inserting a single member stays O(1); these are merged on the next rebuild.
+        # The slot of each member (its position in sorted_ids, or in its pending list) is tracked
+        # so that a member can be taken out of its cell in O(1) by swapping it with the last member.
+        # Removed members have their cell set to -1, and their ids are kept in _free_ids (a stack) so that
+        # later insertions reuse them, most recently removed first, before new ids are appended.
+        # The objects of members inserted from positions (i.e., their labels) are only
+        # created when they are first asked for; until then they are held as (n, make_members) entries.
+        # Positions passed to insert_positions on an empty cell list with copy=False (or as a read-only array),
+        # and the arrays memory mapped by load, are used in place; the names of these arrays are kept in _adopted,
+        # and the arrays are only copied once the cell list needs to change them.
+        # In sparse mode, cell_start and cell_count only hold the occupied cells (the cell ids of which are kept,
+        # sorted, in _occupied) followed by one empty entry that any unoccupied cell maps to (see _cell_slots).
+        self._member_objects = []
+        self._lazy_members = []
+        self._member_cells = np.empty(16, dtype=int)
+        self._member_xyz = np.empty((16, 3), dtype=float)
+        self._member_slot = np.empty(16, dtype=int)
+        self._member_pending = np.empty(16, dtype=bool)
+        self._adopted = set()
+        self._n_members = 0
+        self._n_removed = 0
+        self._free_ids = []
+        self._object_index = None
+        self._sorted_ids = np.empty(0, dtype=int)
+        n_slots = 1 if self._sparse else self._n_cells_total
+        self._cell_start = np.zeros(n_slots, dtype=int)
+        self._cell_count = np.zeros(n_slots, dtype=int)
+        self._occupied = np.empty(0, dtype=int)
+        self._sparse_tables = {}
+        self._csr_dirty = False
+        self._pending = {}
+        self._n_pending = 0
+        self._n_holes = 0
+        self._neighbor_cache = {}
+
+    def _reserve(self, n_needed):
+        # grow the member storage so it can hold at least n_needed members
+        if n_needed <= len(self._member_cells):
+            return
+        capacity = max(n_needed, 2*len(self._member_cells))
+        for name in ['_member_cells', '_member_xyz', '_member_slot', '_member_pending']:
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._n_members] = old[:self._n_members]
+            setattr(self, name, new)
+            self._adopted.discard(name)
+
+    def _own_arrays(self):
+        # copy the adopted arrays before they are modified; the member storage keeps its capacity
+        for name in self._adopted:
+            old = getattr(self, name)
+            if name in ['_member_cells', '_member_xyz']:
+                new = np.empty((len(self._member_slot),) + old.shape[1:], dtype=old.dtype)
+                new[:self._n_members] = old[:self._n_members]
+            else:
+                new = np.array(old)
+            setattr(self, name, new)
+        self._adopted.clear()
+
+    def _append_members(self, members, cells, xyz, adopt=False):
+        # add members (along with the cells they fall in and their positions) to the member storage, reusing
+        # the ids of removed members first; returns the member id of each new member.
+        # members is either a list, a function that creates the list when it is first needed,
+        # or None to label the members by their member ids.
+        # If adopt is True, xyz becomes the position storage (only allowed when the cell list is empty).
+        n_new = len(cells)
+        n_reused = min(n_new, len(self._free_ids))
+        reused = self._free_ids[len(self._free_ids)-n_reused:][::-1]
+        del self._free_ids[len(self._free_ids)-n_reused:]
+        first_id = self._n_members
+        n_needed = first_id + n_new - n_reused
+        ids = np.concatenate([np.array(reused, dtype=int), np.arange(first_id, n_needed)])
+        if members is None:
+            members = ids.tolist
+
+        self._reserve(n_needed)
+        self._own_arrays()
+        self._member_cells[ids] = cells
+        if adopt:
+            self._member_xyz = xyz
+            self._adopted.add('_member_xyz')
+        else:
+            self._member_xyz[ids] = xyz
+
+        if n_reused:
+            # the objects of the reused ids replace those of the removed members
+            if callable(members):
+                members = list(members())
+            objects = self._objects()
+            for i, member in zip(reused, members):
+                objects[i] = member
+            self._n_removed -= n_reused
+        appended = members[n_reused:] if n_reused else members
+        if callable(appended):
+            self._lazy_members.append((n_needed - first_id, appended))
+            self._object_index = None
+        elif self._lazy_members:
+            self._lazy_members.append((n_needed - first_id, lambda: appended))
+            self._object_index = None
+        else:
+            self._member_objects.extend(appended)
+        self._n_members = n_needed
+        if self._object_index is not None:
+            for i, member in zip(ids.tolist(), members):
+                self._object_index[id(member)] = i
+
+        if self._n_pending + self._n_holes + n_new <= self._pending_limit():
+            for i, c in zip(ids.tolist(), np.asarray(cells).tolist()):
+                self._add_pending(i, c)
+        else:
+            self._mark_dirty()
+        return ids
+
+    def _objects(self):
+        # the object of each member id, creating the objects of lazily inserted members if needed
+        if self._lazy_members:
+            first_id = len(self._member_objects)
+            for n, make_members in self._lazy_members:
+                members = list(make_members())
+                if len(members) != n:
+                    raise Exception(f'Expected {n} members, but found {len(members)}.')
+                self._member_objects.extend(members)
+            self._lazy_members = []
+            removed = np.nonzero(self._member_cells[first_id:self._n_members] < 0)[0] + first_id
+            for i in removed.tolist():
+                self._member_objects[i] = None
+        return self._member_objects
+
+    def _pending_limit(self):
+        # how many pending members (and holes left by members moving out of a cell) are allowed
+        # before the sorted layout is rebuilt from scratch
+        if self._csr_dirty:
+            return -1
+        return max(256, len(self._sorted_ids)//8)
+
+    def _mark_dirty(self):
+        # the sorted layout will be fully rebuilt the next time it is needed
+        self._csr_dirty = True
+        self._pending = {}
+        self._n_pending = 0
+        self._n_holes = 0
+        self._neighbor_cache.clear()
+
+    def _add_pending(self, i, c):
+        # put member i at the end of the pending list of cell c
+        pending = self._pending.setdefault(c, [])
+        self._member_slot[i] = len(pending)
+        self._member_pending[i] = True
+        pending.append(i)
+        self._n_pending += 1
+        if self._neighbor_cache:
+            self._invalidate_neighbor_cache(c)
+
+    def _take_out(self, i):
+        # take member i out of its current cell by swapping it with the last member of that cell
+        c = self._member_cells[i]
+        slot = self._member_slot[i]
+        if self._member_pending[i]:
+            pending = self._pending[c]
+            last = pending.pop()
+            if last != i:
+                pending[slot] = last
+                self._member_slot[last] = slot
+            self._n_pending -= 1
+        else:
+            s = self._cell_slots(c)
+            end = self._cell_start[s] + self._cell_count[s] - 1
+            last = self._sorted_ids[end]
+            self._sorted_ids[slot] = last
+            self._member_slot[last] = slot
+            self._cell_count[s] -= 1
+            self._n_holes += 1
+        if self._neighbor_cache:
+            self._invalidate_neighbor_cache(c)
+
+    def _relocate(self, ids, cells):
+        # move members to new cells, touching only the cells involved
+        self._own_arrays()
+        if self._csr_dirty or self._n_pending + self._n_holes + len(ids) > self._pending_limit():
+            self._member_cells[ids] = cells
+            self._mark_dirty()
+            return
+        for i, c in zip(np.asarray(ids).tolist(), np.asarray(cells).tolist()):
+            self._take_out(i)
+            self._member_cells[i] = c
+            self._add_pending(i, c)
+
+    def _check_member(self, member_id):
+        # make sure a member id refers to a member that is in the cell list
+        if not 0 <= member_id < self._n_members or self._member_cells[member_id] < 0:
+            raise Exception(f'Member {member_id} is not in the cell list.')
+
+    def _invalidate_neighbor_cache(self, c):
+        # drop the cached neighbor members of every cell that could have c as a neighbor
+        ijk = np.array([c % self._n_cells[0], (c//self._n_cells[0]) % self._n_cells[1],
+                        c//(self._n_cells[0]*self._n_cells[1])])
+        for z in range(-1, 2):
+            for y in range(-1, 2):
+                for x in range(-1, 2):
+                    i, j, k = (ijk + [x, y, z]) % self._n_cells
+                    self._neighbor_cache.pop(i + j*self._n_cells[0] + k*self._n_cells[0]*self._n_cells[1], None)
+
+    def _build_csr(self):
+        # sort member ids by cell (stable, so insertion order is kept within a cell);
+        # removed members have a cell of -1, so they sort to the front and are dropped
+        cells = self._member_cells[:self._n_members]
+        n_slots = self._n_cells_total
+        if self._sparse:
+            # sort by the position of the cell among the occupied cells instead of by cell
+            self._occupied = np.unique(cells[cells >= 0])
+            self._sparse_tables = {}
+            cells = np.where(cells >= 0, np.searchsorted(self._occupied, cells), -1)
+            n_slots = len(self._occupied) + 1
+        if self._kernels is not None:
+            self._sorted_ids, self._cell_count, self._cell_start = self._kernels.counting_sort(cells, n_slots)
+        else:
+            self._sorted_ids = np.argsort(cells, kind='stable')[self._n_removed:]
+            self._cell_count = np.bincount(cells[self._sorted_ids], minlength=n_slots)
+            self._cell_start = np.cumsum(self._cell_count) - self._cell_count
+        self._adopted.difference_update(['_sorted_ids', '_cell_count', '_cell_start'])
+        self._member_slot[self._sorted_ids] = np.arange(len(self._sorted_ids))
+        self._member_pending[:self._n_members] = False
+        self._csr_dirty = False
+        self._pending = {}
+        self._n_pending = 0
+        self._n_holes = 0
+
+    def _ensure_csr(self, merge_pending=False):
+        # rebuild the sorted layout if needed; optionally fold any pending members (and holes) into it
+        if self._csr_dirty or (merge_pending and (self._n_pending or self._n_holes)):
+            self._build_csr()
+
+    def _member_ids(self, c):
+        # ids of the members within cell c
+        self._ensure_csr()
+        s = self._cell_slots(c)
+        start = self._cell_start[s]
+        ids = self._sorted_ids[start:start+self._cell_count[s]]
+        pending = self._pending.get(c)
+        if pending:
+            ids = np.concatenate([ids, pending])
+        return ids
+
+    def _neighbor_member_ids(self, c):
+        # ids of the members within the neighboring cells of c, along with the cell each came from
+        # and the periodic image shift to apply to each. These are resolved on demand from the
+        # members of the neighboring cells.
+        if c in self._neighbor_cache:
+            return self._neighbor_cache[c]
+        self._ensure_csr()
+        neighbor_cells, neighbor_shifts = self._neighbor_row(c)
+        if self._n_pending:
+            per_cell = [self._member_ids(neigh) for neigh in neighbor_cells.tolist()]
+            counts = np.array([len(ids) for ids in per_cell], dtype=int)
+            ids = np.concatenate(per_cell) if per_cell else np.empty(0, dtype=int)
+        else:
+            slots = self._cell_slots(neighbor_cells)
+            counts = self._cell_count[slots]
+            ids = self._sorted_ids[_ragged_arange(self._cell_start[slots], counts)]
+        result = (ids.astype(int), np.repeat(neighbor_cells, counts), np.repeat(neighbor_shifts, counts, axis=0))
+        if self._cache_neighbors:
+            # the cached arrays are shared by later queries, so they are made read-only
+            for array in result:
+                array.flags.writeable = False
+            self._neighbor_cache[c] = result
+        return result
+
+    def _offset_cells(self, cells, offsets):
+        # the cells at the given offsets (x, y, z) from each of the given cells, along with the periodic image
+        # shift of each; this is computed from the cell indices, so no table is needed.
+        # -1 marks cells that would be across a non-periodic boundary, and their shift is set to 0.
+        n = self._n_cells
+        cells = np.asarray(cells, dtype=int)
+        ijk = np.stack([cells % n[0], (cells//n[0]) % n[1], cells//(n[0]*n[1])], axis=1)
+        raw = ijk[:, None, :] + offsets[None, :, :]
+        shifts = raw // n
+        wrapped = raw - shifts*n
+        neighbors = wrapped[..., 0] + wrapped[..., 1]*n[0] + wrapped[..., 2]*n[0]*n[1]
+        invalid = ~((shifts == 0) | self._periodicity).all(axis=2)
+        neighbors[invalid] = -1
+        shifts[invalid] = 0
+        return neighbors, shifts
+
+    def _surrounding_cells(self, cells):
+        # the cell itself and its 26 neighbors, for each of the given cells, along with the periodic image
+        # shift of each; this does not depend on the list type.
+        return self._offset_cells(cells, _POINT_OFFSETS)
+
+    def _neighbor_row(self, c):
+        # the neighboring cells of cell c (leaving out those across a non-periodic boundary) and their shifts
+        if self._sparse:
+            neighbors, shifts = self._offset_cells([c], self._stencil)
+            valid = neighbors[0] >= 0
+            return neighbors[0][valid], shifts[0][valid]
+        row = self._neighbor_table[c]
+        valid = row >= 0
+        return row[valid].astype(int), self._shift_table[c][valid].astype(int)
+
+    def _cell_slots(self, cells):
+        # the index into cell_start and cell_count of each of the given cells: the cell itself, or in sparse mode
+        # its position among the occupied cells, with unoccupied cells mapped to the empty entry at the end
+        if not self._sparse:
+            return cells
+        slots = np.searchsorted(self._occupied, cells)
+        n_occupied = len(self._occupied)
+        if n_occupied == 0:
+            return slots
+        found = self._occupied[np.minimum(slots, n_occupied-1)] == cells
+        return np.where(found, slots, n_occupied)
+
+    def _csr_tables(self, half=False):
+        # the neighbor and shift tables indexed like cell_start and cell_count; in sparse mode these are built
+        # for the occupied cells only, with neighbors given by their index into cell_start and cell_count and
+        # unoccupied neighbors marked -1. With half=True the tables are restricted to the half stencil.
+        # The CSR layout must be up to date (see _ensure_csr).
+        half = half or self._list_type == 'half'
+        if not self._sparse:
+            if not half or self._list_type == 'half':
+                return self._neighbor_table, self._shift_table
+            half_offsets = self._stencil_offsets(half=True)
+            columns = np.nonzero((self._stencil[:, None, :] == half_offsets[None, :, :]).all(axis=2).any(axis=1))[0]
+            return self._neighbor_table[:, columns], self._shift_table[:, columns]
+
+        if half not in self._sparse_tables:
+            offsets = self._stencil_offsets(half=True) if half else self._stencil
+            neighbors, shifts = self._offset_cells(self._occupied, offsets)
+            slots = self._cell_slots(neighbors)
+            slots[(neighbors < 0) | (slots == len(self._occupied))] = -1
+            # the empty entry at the end has no neighbors
+            neighbor_table = np.full((len(self._occupied)+1, len(offsets)), -1, dtype=np.int32)
+            neighbor_table[:-1] = slots
+            shift_table = np.zeros((len(self._occupied)+1, len(offsets), 3), dtype=np.int8)
+            shift_table[:-1] = shifts
+            self._sparse_tables[half] = (neighbor_table, shift_table)
+        return self._sparse_tables[half]
+
+    def _cell_centers(self, cells):
+        # the center of each of the given cells
+        n = self._n_cells
+        cells = np.asarray(cells, dtype=int)
+        ijk = np.stack([cells % n[0], (cells//n[0]) % n[1], cells//(n[0]*n[1])], axis=1)
+        if self._orthorhombic:
+            return ijk*self._cell_sizes+self._box_min+self._cell_sizes/2.0
+        return ((ijk+0.5)/n) @ self._box_matrix + self._box_min
+
+    def _stencil_offsets(self, half):
+        # offsets (x, y, z) to the neighboring cells, in the order z, y, x are looped over
+        offsets = []
+        for z in range(-1, 2):
+            for y in range(-1, 2):
+                for x in range(-1, 2):
+                    if x == 0 and y == 0 and z == 0:
+                        continue
+                    if half:
+                        # put in some conditions to give us half of the neighboring cells
+                        if x > 0:
+                            continue
+                        if x == 0:
+                            if y > z:
+                                continue
+                            if z < 0 and y == z:
+                                continue
+                    offsets.append([x, y, z])
+        return np.array(offsets, dtype=int)
+
+    def _init_grid(self, half):
+        # build tables of the neighbors of each cell and how
+        # to shift them across periodic boundaries, using broadcasting rather than looping over cells.
+        # The neighbor table has shape (n_cells_total, n_stencil) with -1 marking offsets that fall
+        # outside of a non-periodic box; the shift table has shape (n_cells_total, n_stencil, 3).
+        # In sparse mode only the stencil is kept, and nothing is allocated per cell.
+        n = self._n_cells
+        self._stencil = self._stencil_offsets(half)
+        if self._sparse:
+            self._neighbor_table = None
+            self._shift_table = None
+            return
+
+        index, valid, shift = [], [], []
+        for d in range(0, 3):
+            # for each index along dimension d, where each of the offsets -1, 0, 1 lands
+            raw = np.arange(n[d])[:, None] + self._stencil[None, :, d]
+            valid.append(((raw >= 0) & (raw < n[d])) | self._periodicity[d])
+            index.append(raw % n[d])
+            shift.append(raw // n[d])
+
+        # combine the dimensions; ordering the axes as z, y, x gives the cell index ordering
+        neighbors = ((index[2]*n[0]*n[1])[:, None, None, :] + (index[1]*n[0])[None, :, None, :]
+                     + index[0][None, None, :, :])
+        mask = valid[2][:, None, None, :] & valid[1][None, :, None, :] & valid[0][None, None, :, :]
+        n_stencil = len(self._stencil)
+        self._neighbor_table = np.where(mask, neighbors, -1).astype(np.int32).reshape(-1, n_stencil)
+
+        self._shift_table = np.zeros((n[2], n[1], n[0], n_stencil, 3), dtype=np.int8)
+        self._shift_table[..., 0] = shift[0][None, None, :, :]
+        self._shift_table[..., 1] = shift[1][None, :, None, :]
+        self._shift_table[..., 2] = shift[2][:, None, None, :]
+        self._shift_table = self._shift_table.reshape(-1, n_stencil, 3)
+        self._shift_table[self._neighbor_table < 0] = 0
 
-    def _init_full(self):
-        #initialize empty cells and calculate the center of each
-        for i in range(0, self._n_cells_total):
-            cell_temp = Cell()
-            
-            cell_temp._pos[0] = (i%self._n_cells[0])*self._cell_sizes[0]+self._box_min[0]+self._cell_sizes[0]/2.0
-            cell_temp._pos[1] = (int(i/self._n_cells[0])%self._n_cells[1])*self._cell_sizes[1]+self._box_min[1]+self._cell_sizes[1]/2.0
-            cell_temp._pos[2] = (int(i/(self._n_cells[0]*self._n_cells[1]))%self._n_cells[2])*self._cell_sizes[2]+self._box_min[2]+self._cell_sizes[2]/2.0
-
-            self.cells.append(cell_temp)
-
-        #define which cells are neighboring
-        for k in range(0,self._n_cells[2]):
-            for j in range(0,self._n_cells[1]):
-                for i in range(0,self._n_cells[0]):
-                    c = i + j*self._n_cells[0] + k*self._n_cells[0]*self._n_cells[1]
-                    
-                    start = []
-                    end = []
-                    
-                    
-                    for kk, tmp in enumerate([i,j,k]):
-                        
-                        if not self._periodicity[kk]:
-                            if tmp == 0:
-                                start.append(0)
-                            else:
-                                start.append(-1)
-                            if tmp == self._n_cells[kk]-1:
-                                end.append(0)
-                            else:
-                                end.append(1)
-                        else:
-                            start.append(-1)
-                            end.append(1)
-                            
-                    for z in range(start[2], end[2]+1):
-                        for y in range(start[1], end[1]+1):
-                            for x in range(start[0], end[0]+1):
-                                cn = (i+x+self._n_cells[0])%self._n_cells[0] + \
-                                 ((j+y+self._n_cells[1])%self._n_cells[1])*self._n_cells[0]+\
-                                 ((k+z+self._n_cells[2])%self._n_cells[2])*self._n_cells[0]*self._n_cells[1]
-                                if cn != c:
-                                    self.cells[c]._neighbor_cells.append(cn)
-                                    
-        for c, cell in enumerate(self.cells):
-            for neigh in cell._neighbor_cells:
-                dist = (self.cells[c].pos-self.cells[neigh].pos)/self._box.lengths
-                flag = []
-                for i in range(0,3):
-                    flag.append(self._anint(dist[i]))
-                cell.neighbor_cells_shift[neigh] = flag
-
-    def _init_half(self):
-        # initialize empty cells and calculate the center of each
-        for i in range(0, self._n_cells_total):
-            cell_temp = Cell()
-
-            cell_temp._pos[0] = (i % self._n_cells[0]) * self._cell_sizes[0] + self._box_min[0] + self._cell_sizes[
-                0] / 2.0
-            cell_temp._pos[1] = (int(i / self._n_cells[0]) % self._n_cells[1]) * self._cell_sizes[1] + self._box_min[
-                1] + self._cell_sizes[1] / 2.0
-            cell_temp._pos[2] = (int(i / (self._n_cells[0] * self._n_cells[1])) % self._n_cells[2]) * self._cell_sizes[
-                2] + self._box_min[2] + self._cell_sizes[2] / 2.0
-
-            self.cells.append(cell_temp)
-
-        # define which cells are neighboring
-        for k in range(0, self._n_cells[2]):
-            for j in range(0, self._n_cells[1]):
-                for i in range(0, self._n_cells[0]):
-                    c = i + j * self._n_cells[0] + k * self._n_cells[0] * self._n_cells[1]
-
-                    start = []
-                    end = []
-
-                    for kk, tmp in enumerate([i, j, k]):
-
-                        if not self._periodicity[kk]:
-                            if tmp == 0:
-                                start.append(0)
-                            else:
-                                start.append(-1)
-                            if tmp == self._n_cells[kk] - 1:
-                                end.append(0)
-                            else:
-                                end.append(1)
-                        else:
-                            start.append(-1)
-                            end.append(1)
-
-                    for z in range(start[2], end[2]+1 ):
-                        for y in range(start[1], end[1] + 1):
-                            for x in range(start[0], end[0]+1):
-
-                                # put in some conditions to give us half of the neighboring cells
-
-                                if x == 0 and y == 0 and z == 0:
-                                    continue
-                                if x > 0:
-                                    continue
-                                if x == 0:
-                                    if y > z:
-                                        continue
-                                    if z < 0 and  y == z:
-                                        continue
-
-                                cn = (i + x + self._n_cells[0]) % self._n_cells[0] + \
-                                     ((j + y + self._n_cells[1]) % self._n_cells[1]) * self._n_cells[0] + \
-                                     ((k + z + self._n_cells[2]) % self._n_cells[2]) * self._n_cells[0] * self._n_cells[
-                                         1]
-                                if cn != c:
-                                    self.cells[c]._neighbor_cells.append(cn)
-
-        for c, cell in enumerate(self.cells):
-            for neigh in cell._neighbor_cells:
-                dist = (self.cells[c].pos - self.cells[neigh].pos) / self._box.lengths
-                flag = []
-                for i in range(0, 3):
-                    flag.append(self._anint(dist[i]))
-                cell.neighbor_cells_shift[neigh] = flag
-    
     def cell_containing(self, xyz):
         """Return the cell that contains a given point in 3d space.
 
@@ -236,17 +873,9 @@ class CellList():
         Returns
         ------
         c : int
-            The cell containing the point
+            The cell containing the point; a point on the upper face of the box belongs to the last cell.
         """
-        if (np.array(xyz) <self._box_min).any():
-            raise Exception('Particle outside bounds of the box.')
-        if ((np.array(xyz) - self._box_min) > np.array(self._box.lengths)).any():
-            raise Exception('Particle outside bounds of the box.')
-            
-        vals = np.array((np.array(xyz)-self._box_min)/self._cell_sizes, dtype=int)
-        c = vals[0]+vals[1]*self._n_cells[0]+vals[2]*self._n_cells[0]*self._n_cells[1]
-        
-        return c
+        return int(self._bin_positions(np.reshape(xyz, (1, 3)))[0])
         
     def _shift(self, x):
         if x >= 1:
@@ -256,23 +885,109 @@ class CellList():
         else:
             return 0
             
-    def _anint(self, x):
-        # function to construct periodic images
-        if x >= 0.5:
-            return 1
-        elif x < -0.5:
-            return -1
-        else:
-            return 0
-            
     def _wrap_position(self, xyz):
-        deltas = (np.array(xyz)-self._box_min)/np.array(self._box.lengths)
+        if not self._orthorhombic:
+            return self.wrap_positions(xyz)[0]
+        deltas = (np.array(xyz)-self._box_min)/self._box_lengths
         xyz_shifted = np.array(xyz)
         for i, delta in enumerate(deltas):
             if self._periodicity[i]:
-                xyz_shifted[i] = xyz[i] - self._shift(delta)*self._box.lengths[i]
+                xyz_shifted[i] = xyz[i] - self._shift(delta)*self._box_lengths[i]
 
         return xyz_shifted
+
+    def wrap_positions(self, xyz):
+        """Wrap an array of positions into the box, based on the defined periodicity.
+        This is equivalent to wrapping each position individually, but operates on all positions at once.
+
+        Parameters
+        ----------
+        xyz : np.ndarray, shape=(N,3), dtype=float
+            The positions to wrap.
+
+        Returns
+        ------
+        xyz_wrapped : np.ndarray, shape=(N,3), dtype=float
+            The wrapped positions; positions are not changed along non-periodic dimensions.
+        """
+        xyz = np.array(xyz, dtype=float).reshape(-1, 3)
+        deltas = self._fractional(xyz)
+        shifts = np.where(deltas >= 1, np.trunc(deltas), np.where(deltas < 0, np.trunc(deltas-1), 0.0))
+        shifts[:, ~self._periodicity] = 0.0
+        return xyz - shifts @ self._box_matrix
+
+    def _fractional(self, xyz):
+        # position relative to box_min, in units of the box vectors
+        if self._orthorhombic:
+            return (xyz-self._box_min)/self._box_lengths
+        return (xyz-self._box_min) @ self._box_matrix_inv
+
+    def _minimum_image(self, vectors):
+        # apply the minimum image convention to an (N,3) array of displacement vectors
+        vectors = np.array(vectors, dtype=float).reshape(-1, 3)
+        if self._orthorhombic:
+            images = np.round(vectors/self._box_lengths)
+        else:
+            images = np.round(vectors @ self._box_matrix_inv)
+        images[:, ~self._periodicity] = 0.0
+        return vectors - images @ self._box_matrix
+
+    def cells_containing(self, xyz, wrap_pbc=False, return_outside=False):
+        """Return the cells that contain an array of points in 3d space.
+        Unlike cell_containing, points outside of the box do not raise an exception;
+        they are assigned a cell of -1 and can optionally be reported as a mask.
+
+        Parameters
+        ----------
+        xyz : np.ndarray, shape=(N,3), dtype=float
+            The points of interest.
+        wrap_pbc : bool, default=False
+            If True, points outside of the box bounds will be wrapped to the other side based on defined periodicity.
+        return_outside : bool, default=False
+            If True, also return a boolean mask of the points that are outside of the box.
+
+        Returns
+        ------
+        cells : np.ndarray, shape=(N), dtype=int
+            The cell containing each point, or -1 if the point is outside of the box.
+        outside : np.ndarray, shape=(N), dtype=bool
+            True for each point outside of the box; only returned if return_outside is True.
+        """
+        xyz = np.asarray(xyz, dtype=float).reshape(-1, 3)
+        if wrap_pbc:
+            xyz = self.wrap_positions(xyz)
+        if self._kernels is not None:
+            if self._orthorhombic:
+                cells, outside = self._kernels.bin_positions(xyz - self._box_min, self._cell_sizes, True,
+                                                             self._box_lengths, self._n_cells)
+            else:
+                cells, outside = self._kernels.bin_positions(self._fractional(xyz), self._n_cells.astype(float),
+                                                             False, np.ones(3), self._n_cells)
+        else:
+            if self._orthorhombic:
+                xyz = xyz - self._box_min
+                outside = ((xyz < 0) | (xyz > self._box_lengths)).any(axis=1)
+                vals = np.floor(xyz/self._cell_sizes).astype(int)
+            else:
+                fractional = self._fractional(xyz)
+                outside = ((fractional < 0) | (fractional > 1)).any(axis=1)
+                vals = np.floor(fractional*self._n_cells).astype(int)
+
+            # a point that sits exactly on the upper face of the box belongs to the last cell
+            vals = np.minimum(vals, self._n_cells-1)
+            cells = vals[:, 0] + vals[:, 1]*self._n_cells[0] + vals[:, 2]*self._n_cells[0]*self._n_cells[1]
+            cells[outside] = -1
+        if return_outside:
+            return cells, outside
+        return cells
+
+    def _bin_positions(self, xyz, wrap_pbc=False):
+        # cells_containing for positions that must all be within the box
+        cells, outside = self.cells_containing(xyz, wrap_pbc=wrap_pbc, return_outside=True)
+        if outside.any():
+            raise Exception(f'{outside.sum()} particle(s) outside bounds of the box, '
+                            f'the first at index {np.argmax(outside)}.')
+        return cells
         
     def _check_cell(self, c):
         # The cell_containing function  explicitly checks if a particle is within the
@@ -288,6 +1003,7 @@ class CellList():
     def insert_compound_particles(self, compound, wrap_pbc=False):
         """This will look at the lowest level of the hierarchy of an mbuild Compound
         (i.e., the particles) and insert them  into the cell list.
+        The particle positions are binned in bulk using insert_members.
 
         Parameters
         ----------
@@ -297,6 +1013,8 @@ class CellList():
             If True, particle positions outside of the box bounds will be wrapped to the other side based on defined periodicity.
         Returns
         ------
+        cells : np.ndarray, shape=(n_particles), dtype=int
+            The cell each particle was inserted into.
         """
         if self._from_particles == False and self._from_com == False:
             self._from_particles = True
@@ -304,20 +1022,87 @@ class CellList():
             raise Exception('Cell list should be consistent in use of Compound center of mass or underlying particle positions, not mixing them.')
 
         
-        if isinstance(compound, mb.Compound):
-            for particle in compound.particles():
-                if wrap_pbc:
-                    pos_shifted = self._wrap_position(particle.pos)
-                    c = self.cell_containing(pos_shifted)
-                else:
-                    c = self.cell_containing(particle.pos)
-                if self._check_cell(c):
-                    self.cells[c]._members.append(particle)
-                    for neigh in self.cells[c]._neighbor_cells:
-                        self.cells[neigh]._neighbor_members.append((particle,c))
-                   
-
-                    
+        if _is_mbuild(compound, 'Compound'):
+            return self.insert_members(compound.particles(), compound.xyz, wrap_pbc=wrap_pbc)
+
+    def insert_members(self, members, xyz, wrap_pbc=False):
+        """Insert many members at once, given their positions as an array.
+        All positions are binned in a single vectorized step and each cell is filled in one pass,
+        which is much faster than inserting members one at a time for large systems.
+
+        Parameters
+        ----------
+        members : list
+            The objects to insert (e.g., the particles of an mbuild Compound).
+        xyz : np.ndarray, shape=(N,3), dtype=float
+            The position of each member, e.g., the xyz of an mbuild Compound.
+        wrap_pbc : bool, default=False
+            If True, positions outside of the box bounds will be wrapped to the other side based on defined
+            periodicity.
+
+        Returns
+        ------
+        cells : np.ndarray, shape=(N), dtype=int
+            The cell each member was inserted into.
+        """
+        members = list(members)
+        return self._insert_xyz(members, len(members), xyz, wrap_pbc)[0]
+
+    def insert_positions(self, xyz, ids=None, wrap_pbc=False, copy=True):
+        """Insert members given only their positions, without an object for each member.
+        The positions are copied, unless the cell list is empty and the positions are a C-contiguous float64
+        array of shape (N,3) that is either read-only (e.g., an np.memmap opened with mode 'r') or passed with
+        copy=False. Such an array is used in place, and only copied once the cell list needs to modify the
+        positions (e.g., in update_positions or move); the caller must not change it while it is in use.
+
+        Parameters
+        ----------
+        xyz : np.ndarray, shape=(N,3), dtype=float
+            The position of each member.
+        ids : array-like, shape=(N), dtype=int, optional
+            A label for each member (e.g., the index of a particle within a Compound), which is
+            returned by members, neighbor_members and get_members. Defaults to the member ids.
+        wrap_pbc : bool, default=False
+            If True, positions outside of the box bounds will be wrapped to the other side based on defined
+            periodicity.
+        copy : bool, default=True
+            If False, a writeable array is used in place when possible (see above), rather than copied.
+
+        Returns
+        ------
+        member_ids : np.ndarray, shape=(N), dtype=int
+            The member id of each inserted position.
+        """
+        n_new = len(xyz)
+        members = None
+        if ids is not None:
+            ids = np.asarray(ids, dtype=int).ravel()
+            if len(ids) != n_new:
+                raise Exception(f'Number of ids ({len(ids)}) does not match number of positions ({n_new}).')
+            members = ids.tolist
+        return self._insert_xyz(members, n_new, xyz, wrap_pbc, copy=copy)[1]
+
+    def _insert_xyz(self, members, n_members, xyz, wrap_pbc, copy=True):
+        # bin and append positions, returning their cells and member ids; members is as for _append_members.
+        # The positions are only used in place if they cannot be changed through this array, or if asked to.
+        adopt = (self._n_members == 0 and not wrap_pbc and isinstance(xyz, np.ndarray) and xyz.dtype == float
+                 and xyz.ndim == 2 and xyz.shape[1] == 3 and xyz.flags.c_contiguous
+                 and (not copy or not xyz.flags.writeable))
+        if not adopt:
+            xyz = np.array(xyz, dtype=float).reshape(-1, 3)
+            if wrap_pbc:
+                xyz = self.wrap_positions(xyz)
+        cells = self._bin_positions(xyz)
+        if n_members != len(cells):
+            raise Exception(f'Number of members ({n_members}) does not match number of positions ({len(cells)}).')
+        if len(cells) == 0:
+            return cells, np.empty(0, dtype=int)
+        self._check_cell(cells.max())
+
+        ids = self._append_members(members, cells, xyz, adopt=adopt)
+
+        return cells, ids
+
     def insert_compound_position(self, compound, wrap_pbc=False):
         """This will insert an mbuild Compound into the cell list based upon the
         center-of-mass of the Compound (i.e., compound.pos).
@@ -330,23 +1115,220 @@ class CellList():
             If True, particle positions outside of the box bounds will be wrapped to the other side based on defined periodicity.
         Returns
         ------
+        member_id : int
+            The member id of the Compound in the cell list.
         """
         if self._from_particles == False and self._from_com == False:
             self._from_com = True
         elif self._from_particles== True:
             raise Exception('Cell list should be consistent in use of Compound center of mass or underlying particle positions, not mixing them.')
 
-        if isinstance(compound, mb.Compound):
+        if _is_mbuild(compound, 'Compound'):
             if wrap_pbc:
-                pos_shifted = self._wrap_position(compound.pos)
-                c = self.cell_containing(pos_shifted)
+                pos = self._wrap_position(compound.pos)
             else:
-                c = self.cell_containing(compound.pos)
+                pos = np.array(compound.pos, dtype=float)
+            c = int(self._bin_positions(pos.reshape(1, 3))[0])
             if self._check_cell(c):
-                self.cells[c]._members.append(compound)
-                for neigh in self.cells[c].neighbor_cells:
-                    self.cells[neigh]._neighbor_members.append((compound, c))
+                return int(self._append_members([compound], [c], [pos])[0])
                 
+    def update_positions(self, xyz, wrap_pbc=False):
+        """Update the positions of all members, moving only those that changed cells.
+        The new cell of each member is compared with its stored cell, and only the members
+        that crossed a cell boundary are relocated, rather than re-inserting everything.
+
+        Parameters
+        ----------
+        xyz : np.ndarray, shape=(N,3), dtype=float
+            The new position of each member, in member id order. Either there is one row for each of
+            the members in the cell list (in the order of member_ids), or one row for every member id,
+            including the ids of members that have been removed, in which case those rows are ignored.
+        wrap_pbc : bool, default=False
+            If True, positions outside of the box bounds will be wrapped to the other side based on defined
+            periodicity.
+
+        Returns
+        ------
+        moved : np.ndarray, dtype=int
+            The member ids of the members that changed cells.
+        """
+        xyz = np.array(xyz, dtype=float).reshape(-1, 3)
+        if len(xyz) not in (self.n_members, self._n_members):
+            raise Exception(f'Number of positions ({len(xyz)}) does not match the number of members '
+                            f'({self.n_members}) or of member ids ({self._n_members}).')
+        if wrap_pbc:
+            xyz = self.wrap_positions(xyz)
+
+        if self._n_removed:
+            ids = self.member_ids
+            if len(xyz) == self._n_members:
+                xyz = xyz[ids]
+        else:
+            ids = np.arange(self._n_members)
+        cells = self._bin_positions(xyz)
+
+        self._own_arrays()
+        self._member_xyz[ids] = xyz
+        changed = cells != self._member_cells[ids]
+        moved = ids[changed]
+        if len(moved):
+            self._relocate(moved, cells[changed])
+        return moved
+
+    def update_compound(self, compound, wrap_pbc=False):
+        """Update the cell list with the current particle positions of an mbuild Compound.
+        This is intended for a cell list that was populated with insert_compound_particles(compound);
+        only particles that crossed a cell boundary are relocated.
+        For cell lists populated by center of mass, use update_positions with the new positions.
+
+        Parameters
+        ----------
+        compound :  mb.Compound
+            The mbuild Compound whose particles were inserted into the cell list.
+        wrap_pbc : bool, default=False
+            If True, particle positions outside of the box bounds will be wrapped to the other side based on defined
+            periodicity.
+
+        Returns
+        ------
+        moved : np.ndarray, dtype=int
+            The member ids of the particles that changed cells.
+        """
+        if self._from_com == True:
+            raise Exception('update_compound requires a cell list populated with insert_compound_particles.')
+        return self.update_positions(compound.xyz, wrap_pbc=wrap_pbc)
+
+    def stream(self, frames, query='pairs', r_cut=None, wrap_pbc=False):
+        """Iterate over the frames of a trajectory, reusing this cell list (and its storage) for every frame.
+        The first frame is inserted if the cell list is empty; for each later frame the positions are
+        updated in place, so only the members that changed cells are moved and memory use does not grow
+        with the length of the trajectory.
+
+        Parameters
+        ----------
+        frames : iterable of np.ndarray, shape=(N,3), dtype=float or mb.Compound
+            The positions of the members in each frame, or an mbuild Compound whose particle positions
+            are updated (e.g., with update_xyz) between frames.
+        query : str or callable, default='pairs'
+            The result yielded for each frame: 'pairs' for the output of pairs_within, 'n_pairs' for the
+            number of pairs within r_cut, 'cell_count' for the number of members in each cell,
+            or a function that is called with the cell list.
+        r_cut : float, optional
+            The cutoff distance, required for the 'pairs' and 'n_pairs' queries.
+        wrap_pbc : bool, default=False
+            If True, positions outside of the box bounds will be wrapped to the other side based on defined
+            periodicity.
+
+        Returns
+        ------
+        results : generator
+            The result of the query for each frame.
+        """
+        if query in ['pairs', 'n_pairs'] and r_cut is None:
+            raise Exception(f'A cutoff (r_cut) is required for the {query} query.')
+        if not (callable(query) or query in ['pairs', 'n_pairs', 'cell_count']):
+            raise Exception(f'Unknown query: {query}')
+        if r_cut is not None and r_cut > self._cell_widths.min():
+            raise Exception(f'The cutoff ({r_cut}) cannot be larger than the size of the cells: {self._cell_widths}')
+        # the arguments are checked when stream is called, rather than when the first frame is requested
+        return self._stream(frames, query, r_cut, wrap_pbc)
+
+    def _stream(self, frames, query, r_cut, wrap_pbc):
+        # generator that does the work of stream
+        for frame in frames:
+            if _is_mbuild(frame, 'Compound'):
+                if self._n_members == 0:
+                    self.insert_compound_particles(frame, wrap_pbc=wrap_pbc)
+                else:
+                    self.update_compound(frame, wrap_pbc=wrap_pbc)
+            elif self._n_members == 0:
+                self.insert_positions(frame, wrap_pbc=wrap_pbc)
+            else:
+                self.update_positions(frame, wrap_pbc=wrap_pbc)
+
+            if query == 'pairs':
+                yield self.pairs_within(r_cut)
+            elif query == 'n_pairs':
+                yield len(self.pairs_within(r_cut)[0])
+            elif query == 'cell_count':
+                yield self.cell_count.copy()
+            else:
+                yield query(self)
+
+    def remove(self, member_id):
+        """Remove a single member from the cell list in O(1).
+        The member is swapped with the last member of its cell; other members keep their ids.
+        The id of the removed member is reused by a later insertion.
+
+        Parameters
+        ----------
+        member_id : int
+            The member id of the member to remove (see member_id to look up the id of an inserted object).
+
+        Returns
+        ------
+        """
+        self._check_member(member_id)
+        self._own_arrays()
+        if not self._csr_dirty:
+            self._take_out(member_id)
+        self._member_cells[member_id] = -1
+        if member_id < len(self._member_objects):
+            self._member_objects[member_id] = None
+        self._n_removed += 1
+        self._free_ids.append(member_id)
+        if self._n_pending + self._n_holes > self._pending_limit():
+            self._mark_dirty()
+
+    def move(self, member_id, xyz, wrap_pbc=False):
+        """Move a single member to a new position in O(1), relocating it if it changed cells.
+
+        Parameters
+        ----------
+        member_id : int
+            The member id of the member to move.
+        xyz : np.ndarray, shape=(3), dtype=float
+            The new position of the member.
+        wrap_pbc : bool, default=False
+            If True, a position outside of the box bounds will be wrapped to the other side based on defined
+            periodicity.
+
+        Returns
+        ------
+        c : int
+            The cell that now contains the member.
+        """
+        self._check_member(member_id)
+        pos = self._wrap_position(xyz) if wrap_pbc else np.array(xyz, dtype=float)
+        c = int(self._bin_positions(pos.reshape(1, 3))[0])
+        self._check_cell(c)
+        self._own_arrays()
+        self._member_xyz[member_id] = pos
+        if c != self._member_cells[member_id]:
+            self._relocate([member_id], [c])
+        return c
+
+    def member_id(self, member):
+        """Returns the member id of an object that was inserted into the cell list.
+        If the same object was inserted more than once, the most recent id is returned.
+
+        Parameters
+        ----------
+        member : object
+            An inserted object, e.g., an mbuild Compound.
+
+        Returns
+        ------
+        member_id : int
+            The member id of the object.
+        """
+        if self._object_index is None:
+            self._object_index = {id(obj): i for i, obj in enumerate(self._objects()) if obj is not None}
+        member_id = self._object_index.get(id(member))
+        if member_id is None or self._objects()[member_id] is not member:
+            raise Exception(f'{member} is not in the cell list.')
+        return member_id
+
     def empty_cells(self):
         """Remove all members from the cell list.
 
@@ -356,9 +1338,7 @@ class CellList():
         Returns
         ------
         """
-        for cell in self.cells:
-            cell._members = []
-            cell._neighbor_members = []
+        self._init_member_storage()
         #since it is empty we
         self._from_particles = False
         self._from_com = False
@@ -377,7 +1357,8 @@ class CellList():
             A list of all compounds that are within the cell.
         """
         if self._check_cell(c):
-            return self.cells[c].members
+            objects = self._objects()
+            return [objects[i] for i in self._member_ids(c).tolist()]
  
     def neighbor_members(self, c):
         """Returns members of all neighboring cells.
@@ -393,12 +1374,14 @@ class CellList():
             A list of all compounds that are within the cell.
         """
         if self._check_cell(c):
-            return [m[0] for m in self.cells[c].neighbor_members]
+            objects = self._objects()
+            return [objects[i] for i in self._neighbor_member_ids(c)[0].tolist()]
     
     def neighbor_members_and_min_image_shift(self, c):
         """Returns a list that contains members of all neighboring cells
         and how to shift those members to create a minimum image reconstruction
-        relative to the cell of interest.
+        relative to the cell of interest. The shift is in units of the box vectors,
+        i.e., a member is shifted by shift*box.lengths (or shift @ box_matrix for a triclinic box).
 
         Parameters
         ----------
@@ -409,16 +1392,628 @@ class CellList():
         ------
         (members, shift) : list, dtype=[mb.Compound, np.array shape=(3)]
             A list of all compounds that are within the cell.
+            See neighbor_ids_and_shifts for the same information as arrays.
         """
         if self._check_cell(c):
+            objects = self._objects()
+            ids, _, shifts = self._neighbor_member_ids(c)
             tmp_list = []
-            for neigh in self.cells[c].neighbor_members:
-                shift = self.cells[c].neighbor_cells_shift[neigh[1]]
-                tmp = [neigh[0], np.array(shift)]
-                tmp_list.append(tmp)
+            for i, shift in zip(ids.tolist(), shifts):
+                tmp_list.append([objects[i], np.array(shift)])
             return tmp_list
     
 
+    def neighbor_ids_and_shifts(self, c, return_xyz=False):
+        """Returns the member ids of all members of the neighboring cells of a cell, along with the
+        minimum image shift of each, as arrays. This is a vectorized form of neighbor_members_and_min_image_shift,
+        taken from the precomputed shift table (computed from the cell index for a sparse cell list),
+        that does not create a Python object per member.
+
+        Parameters
+        ----------
+        c : int
+            The cell of interest.
+        return_xyz : bool, default=False
+            If True, also return the positions of the members with the shifts applied.
+
+        Returns
+        ------
+        ids : np.ndarray, shape=(M), dtype=int
+            The member ids of the members of the neighboring cells.
+        shifts : np.ndarray, shape=(M, 3), dtype=int
+            The shift of each member in units of the box vectors; a member is shifted by shifts @ box_matrix
+            (i.e., shifts*box_lengths for an orthorhombic box).
+        xyz : np.ndarray, shape=(M, 3), dtype=float
+            The shifted position of each member, i.e., the minimum image relative to cell c;
+            only returned if return_xyz is True.
+        """
+        self._check_cell(c)
+        ids, _, shifts = self._neighbor_member_ids(c)
+        if return_xyz:
+            return ids, shifts, self._member_xyz[ids] + shifts @ self._box_matrix
+        return ids, shifts
+
+    def has_overlap(self, xyz, r, wrap_pbc=False):
+        """Check if any member is within a distance r of a point, e.g., to reject a trial position when packing.
+        Only the members of the cell that contains the point and its 26 neighbors are considered, and
+        members inserted one at a time are included without rebuilding the sorted layout, so this can be
+        used together with insert_positions to place members incrementally.
+
+        Parameters
+        ----------
+        xyz : np.ndarray, shape=(3), dtype=float
+            The point of interest.
+        r : float
+            The distance; must not be larger than the size of the cells (see cell_widths).
+        wrap_pbc : bool, default=False
+            If True, a point outside of the box bounds will be wrapped to the other side based on defined periodicity.
+
+        Returns
+        ------
+        overlap : bool
+            True if any member is within r of the point (using the minimum image convention).
+        """
+        if r > self._cell_widths.min():
+            raise Exception(f'The distance ({r}) cannot be larger than the size of the cells: {self._cell_widths}')
+        pos = np.asarray(xyz, dtype=float).reshape(1, 3)
+        if wrap_pbc:
+            pos = self.wrap_positions(pos)
+        neighbors, shifts = self._surrounding_cells(self._bin_positions(pos))
+        valid = neighbors[0] >= 0
+        neighbors, shifts = neighbors[0][valid], shifts[0][valid]
+
+        self._ensure_csr()
+        slots = self._cell_slots(neighbors)
+        counts = self._cell_count[slots]
+        ids = [self._sorted_ids[_ragged_arange(self._cell_start[slots], counts)]]
+        images = [np.repeat(shifts, counts, axis=0)]
+        if self._n_pending:
+            # members inserted one at a time are held in per-cell pending lists
+            for c, shift in zip(neighbors.tolist(), shifts):
+                members = self._pending.get(c)
+                if members:
+                    ids.append(np.array(members, dtype=int))
+                    images.append(np.repeat(shift[None, :], len(members), axis=0))
+        ids = np.concatenate(ids)
+        vectors = self._member_xyz[ids] + np.concatenate(images) @ self._box_matrix - pos
+        return bool((np.einsum('ij,ij->i', vectors, vectors) <= r**2).any())
+
+    def any_within(self, xyz, r, wrap_pbc=False):
+        """Check, for each of many points, if any member is within a distance r of the point.
+        The surrounding cells are checked in turn, starting with the cell that contains each point,
+        and points are no longer checked once a member within r has been found.
+
+        Parameters
+        ----------
+        xyz : np.ndarray, shape=(N,3), dtype=float
+            The points of interest.
+        r : float
+            The distance; must not be larger than the size of the cells (see cell_widths).
+        wrap_pbc : bool, default=False
+            If True, points outside of the box bounds will be wrapped to the other side based on defined periodicity.
+
+        Returns
+        ------
+        within : np.ndarray, shape=(N), dtype=bool
+            True for each point that has a member within r (using the minimum image convention).
+        """
+        if r > self._cell_widths.min():
+            raise Exception(f'The distance ({r}) cannot be larger than the size of the cells: {self._cell_widths}')
+        xyz = np.asarray(xyz, dtype=float).reshape(-1, 3)
+        if wrap_pbc:
+            xyz = self.wrap_positions(xyz)
+        neighbors, shifts = self._surrounding_cells(self._bin_positions(xyz))
+        self._ensure_csr(merge_pending=True)
+
+        within = np.zeros(len(xyz), dtype=bool)
+        for k in range(len(_POINT_OFFSETS)):
+            points, ids, vectors = self._offset_candidates(xyz, neighbors, shifts, k, ~within)
+            within[points[np.einsum('ij,ij->i', vectors, vectors) <= r**2]] = True
+            if within.all():
+                break
+        return within
+
+    def points_within(self, xyz, r, wrap_pbc=False, return_vectors=False):
+        """Find all members within a distance r of each of many points.
+
+        Parameters
+        ----------
+        xyz : np.ndarray, shape=(N,3), dtype=float
+            The points of interest.
+        r : float
+            The distance; must not be larger than the size of the cells (see cell_widths).
+        wrap_pbc : bool, default=False
+            If True, points outside of the box bounds will be wrapped to the other side based on defined periodicity.
+        return_vectors : bool, default=False
+            If True, also return the displacement vector from each point to the member.
+
+        Returns
+        ------
+        points : np.ndarray, shape=(n_pairs), dtype=int
+            The index of the point of each pair.
+        ids : np.ndarray, shape=(n_pairs), dtype=int
+            The member id of the member of each pair.
+        distance : np.ndarray, shape=(n_pairs), dtype=float
+            The distance between the point and the member of each pair.
+        vectors : np.ndarray, shape=(n_pairs, 3), dtype=float
+            The minimum image displacement from the point to the member; only returned if return_vectors is True.
+        """
+        if r > self._cell_widths.min():
+            raise Exception(f'The distance ({r}) cannot be larger than the size of the cells: {self._cell_widths}')
+        xyz = np.asarray(xyz, dtype=float).reshape(-1, 3)
+        if wrap_pbc:
+            xyz = self.wrap_positions(xyz)
+        neighbors, shifts = self._surrounding_cells(self._bin_positions(xyz))
+        self._ensure_csr(merge_pending=True)
+
+        point_list, id_list, vector_list = [], [], []
+        for k in range(len(_POINT_OFFSETS)):
+            points, ids, vectors = self._offset_candidates(xyz, neighbors, shifts, k)
+            close = np.einsum('ij,ij->i', vectors, vectors) <= r**2
+            point_list.append(points[close])
+            id_list.append(ids[close])
+            vector_list.append(vectors[close])
+        points = np.concatenate(point_list)
+        ids = np.concatenate(id_list).astype(int)
+        vectors = np.concatenate(vector_list)
+        if return_vectors:
+            return points, ids, np.linalg.norm(vectors, axis=1), vectors
+        return points, ids, np.linalg.norm(vectors, axis=1)
+
+    def _members_near(self, xyz, reach):
+        # the member ids of the members of all cells that could hold members within reach of a point,
+        # where reach may span several cells in each direction; each cell is only included once
+        self._ensure_csr(merge_pending=True)
+        n_shell = np.minimum(np.ceil(reach/self._cell_widths).astype(int), self._n_cells)
+        grids = np.meshgrid(*[np.arange(-n, n+1) for n in n_shell.tolist()], indexing='ij')
+        offsets = np.stack([grid.ravel() for grid in grids], axis=1)
+        cells = self._offset_cells(self._bin_positions(xyz), offsets)[0][0]
+        slots = self._cell_slots(np.unique(cells[cells >= 0]))
+        counts = self._cell_count[slots]
+        return self._sorted_ids[_ragged_arange(self._cell_start[slots], counts)].astype(int)
+
+    def _offset_candidates(self, xyz, neighbors, shifts, k, mask=None):
+        # the members of the k-th surrounding cell of each point (optionally only the points in mask),
+        # as the index of the point, the member id and the displacement from the point to the member
+        valid = neighbors[:, k] >= 0
+        points = np.nonzero(valid if mask is None else valid & mask)[0]
+        slots = self._cell_slots(neighbors[points, k])
+        counts = self._cell_count[slots]
+        ids = self._sorted_ids[_ragged_arange(self._cell_start[slots], counts)]
+        images = np.repeat(shifts[points, k] @ self._box_matrix, counts, axis=0)
+        points = np.repeat(points, counts)
+        return points, ids, self._member_xyz[ids] + images - xyz[points]
+
+    def pairs_within(self, r_cut, return_vectors=False):
+        """Find all pairs of members that are within a cutoff distance of each other.
+        Distances are calculated with the minimum image shifts of the neighboring cells,
+        one cell at a time, using the positions the members had when they were inserted.
+
+        With a 'full' cell list each pair is reported twice, as (i, j) and (j, i);
+        with a 'half' cell list each pair is reported exactly once.
+
+        Parameters
+        ----------
+        r_cut : float
+            The cutoff distance; must not be larger than the size of the cells (see cell_widths).
+        return_vectors : bool, default=False
+            If True, also return the displacement vector from member i to member j.
+
+        Returns
+        ------
+        i : np.ndarray, shape=(n_pairs), dtype=int
+            The member id of the first member of each pair.
+        j : np.ndarray, shape=(n_pairs), dtype=int
+            The member id of the second member of each pair.
+        distance : np.ndarray, shape=(n_pairs), dtype=float
+            The distance between the members of each pair.
+        vectors : np.ndarray, shape=(n_pairs, 3), dtype=float
+            The minimum image displacement from member i to member j; only returned if return_vectors is True.
+        """
+        if r_cut > self._cell_widths.min():
+            raise Exception(f'The cutoff ({r_cut}) cannot be larger than the size of the cells: {self._cell_widths}')
+        self._ensure_csr(merge_pending=True)
+        neighbor_table, shift_table = self._csr_tables()
+        pairs_in_cells = _pairs_in_cells if self._kernels is None else self._kernels.pairs_in_cells
+        i, j, distance, vectors = pairs_in_cells(np.nonzero(self._cell_count)[0], self._member_xyz, self._sorted_ids,
+                                                 self._cell_start, self._cell_count, neighbor_table, shift_table,
+                                                 self._box_matrix, r_cut, half=self._list_type == 'half')
+        if return_vectors:
+            return i, j, distance, vectors
+        return i, j, distance
+
+    def save(self, path):
+        """Save the cell list to a directory, so it can be reloaded without rebuilding it.
+        The grid tables and the member arrays are each written to a .npy file, and the settings to cell_list.json.
+        The member objects are not saved; if the members were labeled by integers (e.g., by insert_positions),
+        the labels are saved, otherwise the members of the loaded cell list are labeled by their member ids.
+
+        Parameters
+        ----------
+        path : str or os.PathLike
+            The directory to write to; it is created if it does not exist.
+
+        Returns
+        ------
+        """
+        self._ensure_csr(merge_pending=True)
+        os.makedirs(path, exist_ok=True)
+        n = self._n_members
+        arrays = {name: getattr(self, name) for name in (_SPARSE_SAVED_ARRAYS if self._sparse else _SAVED_ARRAYS)}
+        arrays['_member_cells'] = arrays['_member_cells'][:n]
+        arrays['_member_xyz'] = arrays['_member_xyz'][:n]
+        for name, array in arrays.items():
+            np.save(os.path.join(path, name.lstrip('_') + '.npy'), array)
+
+        objects = self._objects()
+        live = self._member_cells[:n] >= 0
+        labeled = all(isinstance(obj, (int, np.integer)) for obj, alive in zip(objects, live.tolist()) if alive)
+        if labeled:
+            labels = np.array([obj if alive else -1 for obj, alive in zip(objects, live.tolist())], dtype=int)
+            np.save(os.path.join(path, 'member_labels.npy'), labels)
+
+        settings = {'format': _SAVE_FORMAT,
+                    'box_lengths': self._box_lengths.tolist(),
+                    'box_angles': self._box_angles.tolist(),
+                    'n_cells': self._n_cells.tolist(),
+                    'periodicity': self._periodicity.tolist(),
+                    'box_min': self._box_min.tolist(),
+                    'list_type': self._list_type,
+                    'cache_neighbors': self._cache_neighbors,
+                    'backend': self._backend,
+                    'sparse': self._sparse,
+                    'from_particles': self._from_particles,
+                    'from_com': self._from_com,
+                    'n_members': n,
+                    'n_removed': self._n_removed,
+                    'labeled': labeled}
+        with open(os.path.join(path, 'cell_list.json'), 'w') as f:
+            json.dump(settings, f, indent=2)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Load a cell list written by save.
+        The grid is not rebuilt and the members are not re-inserted. With memory mapping, the arrays are read from
+        disk as they are used and can be shared between processes; an array is copied into memory only if the
+        cell list needs to modify it (e.g., when members are inserted, moved or removed), so the files are not changed.
+
+        Parameters
+        ----------
+        path : str or os.PathLike
+            The directory written by save.
+        mmap_mode : str or None, default='r'
+            The memory mapping mode used to load the arrays (see np.load); None reads them into memory.
+
+        Returns
+        ------
+        cell_list : CellList
+            The loaded cell list.
+        """
+        with open(os.path.join(path, 'cell_list.json')) as f:
+            settings = json.load(f)
+        if settings['format'] != _SAVE_FORMAT:
+            raise Exception(f'Unsupported cell list format: {settings["format"]}')
+
+        cell_list = cls.__new__(cls)
+        cell_list._box = None
+        cell_list._box_lengths = np.array(settings['box_lengths'], dtype=float)
+        cell_list._box_angles = np.array(settings['box_angles'], dtype=float)
+        cell_list._init_geometry(settings['n_cells'], settings['periodicity'], settings['box_min'])
+        cell_list._timings = {}
+        cell_list._init_settings(settings['list_type'], settings['cache_neighbors'], settings['backend'])
+        cell_list._from_particles = settings['from_particles']
+        cell_list._from_com = settings['from_com']
+        cell_list._sparse = settings.get('sparse', False)
+        cell_list._init_member_storage()
+
+        if cell_list._sparse:
+            cell_list._neighbor_table = None
+            cell_list._shift_table = None
+        for name in (_SPARSE_SAVED_ARRAYS if cell_list._sparse else _SAVED_ARRAYS):
+            setattr(cell_list, name, np.load(os.path.join(path, name.lstrip('_') + '.npy'), mmap_mode=mmap_mode))
+        if mmap_mode is not None:
+            cell_list._adopted.update(['_member_cells', '_member_xyz', '_sorted_ids', '_cell_start', '_cell_count'])
+
+        n = settings['n_members']
+        cell_list._n_members = n
+        cell_list._n_removed = settings['n_removed']
+        if cell_list._n_removed:
+            cell_list._free_ids = np.nonzero(cell_list._member_cells[:n] < 0)[0][::-1].tolist()
+        cell_list._member_slot = np.empty(n, dtype=int)
+        cell_list._member_slot[cell_list._sorted_ids] = np.arange(len(cell_list._sorted_ids))
+        cell_list._member_pending = np.zeros(n, dtype=bool)
+        if n:
+            if settings['labeled']:
+                labels = np.load(os.path.join(path, 'member_labels.npy'), mmap_mode=mmap_mode)
+                cell_list._lazy_members.append((n, labels.tolist))
+            else:
+                cell_list._lazy_members.append((n, lambda: range(n)))
+        return cell_list
+
+    def stats(self):
+        """Returns statistics that describe how the members are distributed over the cells.
+        These can be used to choose n_cells, or to detect inputs where the members are concentrated in a few cells.
+
+        Returns
+        ------
+        stats : dict
+            'n_members' : the number of members in the cell list.
+            'n_cells_total' : the total number of cells.
+            'occupancy_histogram' : np.ndarray, where entry k is the number of cells that hold k members.
+            'max_occupancy' : the largest number of members in a cell.
+            'mean_occupancy' : the mean number of members per cell.
+            'empty_fraction' : the fraction of cells that hold no members.
+            'memory_bytes' : the memory used by the arrays of the cell list.
+            'candidate_pairs' : the number of member pairs whose distance is checked by pairs_within.
+            'timings' : the number of calls and total time (in seconds) of each profiled method;
+            only included when profiling is enabled (see enable_profiling).
+        """
+        self._ensure_csr(merge_pending=True)
+        neighbor_table, _ = self._csr_tables()
+        occupied = np.nonzero(self._cell_count)[0]
+        count = self._cell_count[occupied]
+        neighbors = neighbor_table[occupied]
+        neighbor_count = np.where(neighbors >= 0, self._cell_count[neighbors], 0).sum(axis=1)
+        if self._list_type == 'half':
+            intra_count = count*(count-1)//2
+        else:
+            intra_count = count*(count-1)
+        occupancy_histogram = np.bincount(count, minlength=1)
+        occupancy_histogram[0] = self._n_cells_total - len(occupied)
+        stats = {'n_members': self.n_members,
+                 'n_cells_total': int(self._n_cells_total),
+                 'occupancy_histogram': occupancy_histogram,
+                 'max_occupancy': int(count.max(initial=0)),
+                 'mean_occupancy': self.n_members/self._n_cells_total,
+                 'empty_fraction': 1.0 - len(occupied)/self._n_cells_total,
+                 'memory_bytes': sum(value.nbytes for value in vars(self).values() if isinstance(value, np.ndarray)),
+                 'candidate_pairs': int((intra_count + count*neighbor_count).sum())}
+        if self.profiling:
+            stats['timings'] = self.timings
+        return stats
+
+    def __getstate__(self):
+        # the timed wrappers and the compiled kernels cannot be pickled; __setstate__ restores them
+        state = {name: value for name, value in vars(self).items() if name not in _PROFILED_METHODS}
+        state['_kernels'] = None
+        state['_profiling'] = self.profiling
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        profiling = state.pop('_profiling', False)
+        vars(self).update(state)
+        self._kernels = _backend_kernels(self._backend)
+        if profiling:
+            self.enable_profiling()
+
+    def enable_profiling(self):
+        """Record the number of calls to, and the time spent in, the main methods of the cell list.
+        The methods are wrapped on this instance only, so a cell list without profiling has no overhead.
+        Times are inclusive, e.g., the time of insert_members includes its call to cells_containing.
+
+        Returns
+        ------
+        """
+        for name in _PROFILED_METHODS:
+            if name not in vars(self):
+                setattr(self, name, _timed(getattr(self, name), self._timings))
+
+    def disable_profiling(self):
+        """Stop recording timings; the timings recorded so far are kept.
+
+        Returns
+        ------
+        """
+        for name in _PROFILED_METHODS:
+            vars(self).pop(name, None)
+
+    def reset_timings(self):
+        """Discard the timings recorded so far.
+
+        Returns
+        ------
+        """
+        for counter in self._timings.values():
+            counter['calls'] = 0
+            counter['time'] = 0.0
+
+    @property
+    def profiling(self):
+        """Returns whether profiling is enabled.
+        Returns
+        ------
+        profiling : bool
+            True if the calls to the main methods of the cell list are being timed.
+        """
+        return '_init_grid' in vars(self)
+
+    @property
+    def timings(self):
+        """Returns the recorded timings.
+        Returns
+        ------
+        timings : dict
+            For each profiled method that has been called, a dict with the number of 'calls' and the total
+            'time' in seconds.
+        """
+        return {name: dict(counter) for name, counter in self._timings.items() if counter['calls']}
+
+    def iter_cell_pairs(self):
+        """Iterate over the candidate pairs of members, one cell at a time, visiting each unordered pair exactly once.
+        For each cell, the pairs within the cell are given by the upper triangle of its members, followed by the
+        pairs with the members of the neighboring cells in the half stencil (the neighbors listed by a 'half' cell
+        list), so pairs are not repeated even for a 'full' cell list. Unlike half_pairs, no cutoff is applied.
+
+        Returns
+        ------
+        cell_pairs : generator of (c, i, j, images)
+            For each cell c that holds members: the member ids i (in cell c) and j of each candidate pair,
+            and images, an np.ndarray of shape (n_pairs, 3), the periodic image displacement to add to the
+            position of member j, such that the displacement from i to j is xyz[j] + images - xyz[i].
+        """
+        self._ensure_csr(merge_pending=True)
+        neighbor_table, shift_table = self._csr_tables(half=True)
+        slots = np.nonzero(self._cell_count)[0]
+        for c, s in zip(self.occupied_cells.tolist(), slots.tolist()):
+            start = self._cell_start[s]
+            ids = self._sorted_ids[start:start+self._cell_count[s]]
+            a, b = np.triu_indices(len(ids), k=1)
+            i, j, images = [ids[a]], [ids[b]], [np.zeros((len(a), 3))]
+
+            row = neighbor_table[s]
+            valid = row >= 0
+            counts = self._cell_count[row[valid]]
+            neighbor_ids = self._sorted_ids[_ragged_arange(self._cell_start[row[valid]], counts)]
+            neighbor_images = np.repeat(shift_table[s][valid], counts, axis=0) @ self._box_matrix
+            i.append(np.repeat(ids, len(neighbor_ids)))
+            j.append(np.tile(neighbor_ids, len(ids)))
+            images.append(np.tile(neighbor_images, (len(ids), 1)))
+            yield c, np.concatenate(i).astype(int), np.concatenate(j).astype(int), np.concatenate(images)
+
+    def half_pairs(self, r_cut, return_vectors=False):
+        """Find all pairs of members within a cutoff distance, reporting each pair exactly once.
+        Pairs within a cell are found from the upper triangle of its members, and pairs between cells
+        using the half stencil, so about half as many distances are calculated as for pairs_within
+        with a 'full' cell list. For a 'half' cell list this is the same as pairs_within.
+
+        Parameters
+        ----------
+        r_cut : float
+            The cutoff distance; must not be larger than the size of the cells (see cell_widths).
+        return_vectors : bool, default=False
+            If True, also return the displacement vector from member i to member j.
+
+        Returns
+        ------
+        i : np.ndarray, shape=(n_pairs), dtype=int
+            The member id of the first member of each pair.
+        j : np.ndarray, shape=(n_pairs), dtype=int
+            The member id of the second member of each pair.
+        distance : np.ndarray, shape=(n_pairs), dtype=float
+            The distance between the members of each pair.
+        vectors : np.ndarray, shape=(n_pairs, 3), dtype=float
+            The minimum image displacement from member i to member j; only returned if return_vectors is True.
+        """
+        if r_cut > self._cell_widths.min():
+            raise Exception(f'The cutoff ({r_cut}) cannot be larger than the size of the cells: {self._cell_widths}')
+        self._ensure_csr(merge_pending=True)
+        neighbor_table, shift_table = self._csr_tables(half=True)
+        pairs_in_cells = _pairs_in_cells if self._kernels is None else self._kernels.pairs_in_cells
+        i, j, distance, vectors = pairs_in_cells(np.nonzero(self._cell_count)[0], self._member_xyz, self._sorted_ids,
+                                                 self._cell_start, self._cell_count, neighbor_table, shift_table,
+                                                 self._box_matrix, r_cut, half=True)
+        if return_vectors:
+            return i, j, distance, vectors
+        return i, j, distance
+
+    def get_members(self, ids):
+        """Returns the members that correspond to a set of member ids.
+
+        Parameters
+        ----------
+        ids : array-like, dtype=int
+            Member ids, e.g., as returned by pairs_within.
+
+        Returns
+        ------
+        members : list
+            The member for each id.
+        """
+        objects = self._objects()
+        return [objects[i] for i in np.asarray(ids, dtype=int).ravel().tolist()]
+
+    @property
+    def xyz(self):
+        """Returns the positions of the members, as they were binned.
+        Returns
+        ------
+        xyz : np.array, shape=(N, 3), dtype=float
+            The position of each member, in member id order. Rows for removed members are not meaningful.
+        """
+        return self._member_xyz[:self._n_members]
+
+    @property
+    def cell_start(self):
+        """Returns the offset of each cell into sorted_ids.
+        Returns
+        ------
+        cell_start : np.array, shape=(n_cells_total), dtype=int
+            The members of cell c are sorted_ids[cell_start[c]:cell_start[c]+cell_count[c]].
+            For a sparse cell list, there is one entry for each of the occupied_cells, followed by an entry
+            for an empty cell, i.e., the members of occupied_cells[k] are given by cell_start[k] and cell_count[k].
+        """
+        self._ensure_csr(merge_pending=True)
+        return self._cell_start
+
+    @property
+    def cell_count(self):
+        """Returns the number of members in each cell.
+        Returns
+        ------
+        cell_count : np.array, shape=(n_cells_total), dtype=int
+            The number of members in each cell. For a sparse cell list, the number of members in
+            each of the occupied_cells, followed by a 0 (see cell_start).
+        """
+        self._ensure_csr(merge_pending=True)
+        return self._cell_count
+
+    @property
+    def occupied_cells(self):
+        """Returns the cells that hold members.
+        Returns
+        ------
+        occupied_cells : np.array, dtype=int
+            The index of each cell that holds at least one member, in increasing order.
+        """
+        self._ensure_csr(merge_pending=True)
+        occupied = np.nonzero(self._cell_count)[0]
+        if self._sparse:
+            return self._occupied[occupied]
+        return occupied
+
+    @property
+    def sparse(self):
+        """Returns whether only the occupied cells are stored.
+        Returns
+        ------
+        sparse : bool
+            True if the cell list was initialized with sparse=True.
+        """
+        return self._sparse
+
+    @property
+    def sorted_ids(self):
+        """Returns the member ids sorted by the cell that contains them.
+        Member ids correspond to the order in which members were inserted into the cell list.
+        Returns
+        ------
+        sorted_ids : np.array, shape=(n_members), dtype=int
+            The member ids, grouped by cell.
+        """
+        self._ensure_csr(merge_pending=True)
+        return self._sorted_ids
+
+    @property
+    def member_ids(self):
+        """Returns the member ids of the members in the cell list.
+        Returns
+        ------
+        member_ids : np.array, dtype=int
+            The ids of the members that have not been removed, in increasing order.
+        """
+        return np.nonzero(self._member_cells[:self._n_members] >= 0)[0]
+
+    @property
+    def n_members(self):
+        """Returns the total number of members in the cell list.
+        Returns
+        ------
+        n_members : int
+            The number of members that have been inserted and not removed.
+        """
+        return self._n_members - self._n_removed
+
     @property
     def n_cells(self):
         """Returns a numpy array of the number of cells in each direction.
@@ -459,12 +2054,93 @@ class CellList():
         """
         return self._cell_sizes
         
+    @property
+    def cell_widths(self):
+        """Returns a numpy array of the perpendicular width of the cells in each direction.
+        This is the distance between opposite faces of a cell, and is the same as cell_sizes for an orthorhombic box.
+        Returns
+        ------
+        cell_widths : np.array, dtype=float
+            A numpy array of the perpendicular width of the cells along each box vector.
+        """
+        return self._cell_widths
+
+    @property
+    def box_matrix(self):
+        """Returns the box vectors used to initialize the cell list.
+        Returns
+        ------
+        box_matrix : np.array, shape=(3,3), dtype=float
+            The box vectors as rows; shifting a member by an image shift s moves it by s @ box_matrix.
+        """
+        return self._box_matrix
+
+    @property
+    def neighbor_table(self):
+        """Returns the table of the neighboring cells of each cell.
+        Returns
+        ------
+        neighbor_table : np.array, shape=(n_cells_total, n_stencil), dtype=int32
+            The neighboring cells of each cell, in stencil order; -1 marks neighbors that
+            would be across a non-periodic boundary.
+        """
+        if self._sparse:
+            raise Exception('The neighbor table is not stored by a sparse cell list; '
+                            'use neighbor_ids_and_shifts to get the neighbors of a cell.')
+        return self._neighbor_table
+
+    @property
+    def shift_table(self):
+        """Returns the table of the periodic image shifts of the neighboring cells of each cell.
+        Returns
+        ------
+        shift_table : np.array, shape=(n_cells_total, n_stencil, 3), dtype=int8
+            The shift, in units of the box vectors, to apply to the members of each neighboring cell
+            (see neighbor_table) to get their minimum image relative to the cell.
+        """
+        if self._sparse:
+            raise Exception('The shift table is not stored by a sparse cell list; '
+                            'use neighbor_ids_and_shifts to get the neighbors of a cell.')
+        return self._shift_table
+
+    @property
+    def box_lengths(self):
+        """Returns the lengths of the box.
+        Returns
+        ------
+        box_lengths : np.array, shape=(3), dtype=float
+            The length of each box vector.
+        """
+        return self._box_lengths
+
+    @property
+    def box_angles(self):
+        """Returns the angles of the box.
+        Returns
+        ------
+        box_angles : np.array, shape=(3), dtype=float
+            The angles (alpha, beta, gamma) between the box vectors, in degrees.
+        """
+        return self._box_angles
+
+    @property
+    def backend(self):
+        """Returns the backend used for binning, sorting and finding pairs.
+        Returns
+        ------
+        backend : str
+            Either 'numpy' or 'numba'.
+        """
+        return self._backend
+
     @property
     def box(self):
         """Returns the box information used to initialize the cell list.
         Returns
         ------
         box : mb.Box
-            An mbuild Box.
+            An mbuild Box; if the cell list was initialized from a list of box lengths, it is created on first access.
         """
+        if self._box is None:
+            self._box = _mbuild().Box(self._box_lengths.tolist(), angles=self._box_angles.tolist())
         return self._box
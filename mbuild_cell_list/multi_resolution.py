@@ -0,0 +1,306 @@
+"""Multi-resolution cell list, for members with a wide range of sizes."""
+
+
+__all__ = ["MultiResolutionCellList"]
+
+import warnings
+
+import numpy as np
+
+from .mbuild_cell_list import CellList
+
+
+class MultiResolutionCellList():
+    """Cell list with several levels of cell sizes, for members (e.g., Compounds) with a wide range of sizes,
+    such as nanoparticles in a solvent.
+
+    Each member has a bounding radius, and is binned in the finest level whose radius is at least as large.
+    The cells of level k are at least 2*level_radii[k] + r_cut in size, so a member whose bounding sphere is
+    within r_cut of a member of level k is found in the 27 cells around it, as long as its own radius is no
+    larger than level_radii[k]. Contacts between levels are found by looking up the members of the finer level
+    in the cells of the coarser level, so small members are never compared using the large cells needed for
+    the large members. The box must fit at least 3 cells of this size for every level.
+    """
+    def __init__(self, box, r_cut, level_radii, periodicity=[True,True,True], box_min=[0.0,0.0,0.0], **kwargs):
+        """Initialize the levels of the cell list.
+
+        Parameters
+        ----------
+        box : list, length=3, dtype=float or mb.Box
+            Either an mBuild Box or list of length=3 representing box lengths
+        r_cut : float
+            The cutoff distance between the surfaces of the bounding spheres of two members for them to be in contact.
+        level_radii : list, dtype=float
+            The largest bounding radius of the members of each level, in increasing order.
+        periodicity, list, length=3, type=bool, default=[True,True,True]
+            Periodicity in each box dimensions
+        box_min, list, length=3, dtype=float, default=[0.0,0.0,0.0]
+            Minimum position of the box.
+        **kwargs
+            Additional keyword arguments passed to the CellList of each level (e.g., backend).
+
+        Returns
+        ------
+        """
+        self._level_radii = np.array(level_radii, dtype=float)
+        if len(self._level_radii) == 0 or (np.diff(self._level_radii) <= 0).any():
+            raise Exception(f'level_radii must be a non-empty list in increasing order, found: {level_radii}')
+        self._r_cut = r_cut
+        with warnings.catch_warnings():
+            # cells that are too small are reported below, for the level they belong to
+            warnings.simplefilter('ignore')
+            self._levels = [CellList.from_cutoff(box, 2*radius + r_cut, periodicity=periodicity, box_min=box_min,
+                                                 list_type='half', **kwargs) for radius in self._level_radii]
+        for radius, level in zip(self._level_radii, self._levels):
+            if (level.cell_widths < 2*radius + r_cut).any():
+                raise Exception(f'The box is too small for the level of radius {radius}: its cells '
+                                f'({level.cell_widths}) must be at least 2*radius + r_cut ({2*radius + r_cut}).')
+
+        # members are stored in insertion order (the member id); each level labels its members by their member id
+        self._xyz = np.empty((0, 3), dtype=float)
+        self._radii = np.empty(0, dtype=float)
+        self._member_levels = np.empty(0, dtype=int)
+        self._members = []
+        self._level_ids = [np.empty(0, dtype=int) for level in self._levels]
+
+    def insert_positions(self, xyz, radii, members=None, wrap_pbc=False):
+        """Insert members given their positions and bounding radii.
+
+        Parameters
+        ----------
+        xyz : np.ndarray, shape=(N,3), dtype=float
+            The position (e.g., the center) of each member.
+        radii : float or np.ndarray, shape=(N), dtype=float
+            The bounding radius of each member; must not be larger than the largest level radius.
+        members : list, optional
+            The object for each member (e.g., an mbuild Compound); defaults to the member ids.
+        wrap_pbc : bool, default=False
+            If True, positions outside of the box bounds will be wrapped to the other side based on defined
+            periodicity.
+
+        Returns
+        ------
+        member_ids : np.ndarray, shape=(N), dtype=int
+            The member id of each inserted member.
+        """
+        xyz = np.array(xyz, dtype=float).reshape(-1, 3)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), (len(xyz),))
+        if wrap_pbc:
+            xyz = self._levels[0].wrap_positions(xyz)
+        levels = np.searchsorted(self._level_radii, radii)
+        if (levels == len(self._levels)).any():
+            raise Exception(f'{np.count_nonzero(levels == len(self._levels))} member(s) have a bounding radius larger '
+                            f'than the largest level radius ({self._level_radii[-1]}).')
+        # check all positions before inserting any, so a failed insert leaves the levels consistent
+        self._levels[0]._bin_positions(xyz)
+
+        first_id = len(self._radii)
+        ids = np.arange(first_id, first_id + len(xyz))
+        if members is None:
+            members = ids.tolist()
+        elif len(members) != len(xyz):
+            raise Exception(f'Number of members ({len(members)}) does not match number of positions ({len(xyz)}).')
+        for k in np.unique(levels).tolist():
+            selected = levels == k
+            self._levels[k].insert_positions(xyz[selected], ids=ids[selected])
+            self._level_ids[k] = np.concatenate([self._level_ids[k], ids[selected]])
+
+        self._xyz = np.concatenate([self._xyz, xyz])
+        self._radii = np.concatenate([self._radii, radii])
+        self._member_levels = np.concatenate([self._member_levels, levels])
+        self._members.extend(members)
+        return ids
+
+    def insert_compounds(self, compounds, wrap_pbc=False):
+        """Insert mbuild Compounds, binned by their center (i.e., compound.pos).
+        The bounding radius of each Compound is the largest distance of its particles from its center.
+
+        Parameters
+        ----------
+        compounds : list of mb.Compound
+            The Compounds to insert.
+        wrap_pbc : bool, default=False
+            If True, positions outside of the box bounds will be wrapped to the other side based on defined
+            periodicity.
+
+        Returns
+        ------
+        member_ids : np.ndarray, shape=(N), dtype=int
+            The member id of each Compound.
+        """
+        compounds = list(compounds)
+        xyz = np.array([compound.pos for compound in compounds], dtype=float).reshape(-1, 3)
+        radii = [np.linalg.norm(compound.xyz - pos, axis=1).max() for compound, pos in zip(compounds, xyz)]
+        return self.insert_positions(xyz, radii, members=compounds, wrap_pbc=wrap_pbc)
+
+    def contacts(self):
+        """Find all pairs of members whose bounding spheres are within r_cut of each other,
+        i.e., whose centers are within the sum of their radii plus r_cut. Each pair is reported once.
+        Only the levels that hold members are used; pairs within a level are found with the cells of that level,
+        and pairs between two levels by looking up the members of the finer level in the cells of the coarser one.
+
+        Returns
+        ------
+        i : np.ndarray, shape=(n_pairs), dtype=int
+            The member id of the first member of each pair; it is never in a coarser level than the second member.
+        j : np.ndarray, shape=(n_pairs), dtype=int
+            The member id of the second member of each pair.
+        distance : np.ndarray, shape=(n_pairs), dtype=float
+            The distance between the centers of the members of each pair.
+        """
+        i_list, j_list, distance_list = [], [], []
+        occupied = [k for k, level in enumerate(self._levels) if level.n_members]
+        for b in occupied:
+            coarse = self._levels[b]
+            i, j, distance = coarse.half_pairs(2*self._level_radii[b] + self._r_cut)
+            i_list.append(self._level_ids[b][i])
+            j_list.append(self._level_ids[b][j])
+            distance_list.append(distance)
+            for a in occupied:
+                if a >= b:
+                    break
+                fine_ids = self._level_ids[a]
+                reach = self._level_radii[a] + self._level_radii[b] + self._r_cut
+                points, ids, distance = coarse.points_within(self._xyz[fine_ids], reach)
+                i_list.append(fine_ids[points])
+                j_list.append(self._level_ids[b][ids])
+                distance_list.append(distance)
+
+        if not i_list:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty(0, dtype=float)
+        i = np.concatenate(i_list).astype(int)
+        j = np.concatenate(j_list).astype(int)
+        distance = np.concatenate(distance_list)
+        in_contact = distance <= self._radii[i] + self._radii[j] + self._r_cut
+        return i[in_contact], j[in_contact], distance[in_contact]
+
+    def neighbors(self, xyz, radius=0.0, wrap_pbc=False):
+        """Find the members whose bounding spheres are within r_cut of a sphere at a given position.
+        Levels with a radius of at least the given radius are searched using the cells around the position;
+        for finer levels, whose cells are smaller than the reach of the sphere, all cells within reach are searched.
+
+        Parameters
+        ----------
+        xyz : np.ndarray, shape=(3), dtype=float
+            The center of the sphere.
+        radius : float, default=0.0
+            The radius of the sphere.
+        wrap_pbc : bool, default=False
+            If True, a position outside of the box bounds will be wrapped to the other side based on defined
+            periodicity.
+
+        Returns
+        ------
+        ids : np.ndarray, dtype=int
+            The member ids of the members in contact with the sphere.
+        distance : np.ndarray, dtype=float
+            The distance between the center of the sphere and the center of each member.
+        """
+        pos = np.array(xyz, dtype=float).reshape(1, 3)
+        if wrap_pbc:
+            pos = self._levels[0].wrap_positions(pos)
+        id_list, distance_list = [], []
+        for k, level in enumerate(self._levels):
+            if level.n_members == 0:
+                continue
+            reach = radius + self._level_radii[k] + self._r_cut
+            if radius <= self._level_radii[k]:
+                _, ids, distance = level.points_within(pos, reach)
+                ids = self._level_ids[k][ids]
+            else:
+                ids = self._level_ids[k][level._members_near(pos, reach)]
+                distance = np.linalg.norm(level._minimum_image(self._xyz[ids] - pos), axis=1)
+            id_list.append(ids)
+            distance_list.append(distance)
+
+        if not id_list:
+            return np.empty(0, dtype=int), np.empty(0, dtype=float)
+        ids = np.concatenate(id_list).astype(int)
+        distance = np.concatenate(distance_list)
+        in_contact = distance <= radius + self._radii[ids] + self._r_cut
+        return ids[in_contact], distance[in_contact]
+
+    def get_members(self, ids):
+        """Returns the members that correspond to a set of member ids.
+
+        Parameters
+        ----------
+        ids : array-like, dtype=int
+            Member ids, e.g., as returned by contacts.
+
+        Returns
+        ------
+        members : list
+            The member for each id.
+        """
+        return [self._members[i] for i in np.asarray(ids, dtype=int).ravel().tolist()]
+
+    @property
+    def levels(self):
+        """Returns the cell list of each level.
+        Returns
+        ------
+        levels : list of CellList
+            The cell list of each level, from the finest to the coarsest; members are labeled by their member id.
+        """
+        return self._levels
+
+    @property
+    def level_radii(self):
+        """Returns the largest bounding radius of the members of each level.
+        Returns
+        ------
+        level_radii : np.array, dtype=float
+            The radius of each level.
+        """
+        return self._level_radii
+
+    @property
+    def member_levels(self):
+        """Returns the level of each member.
+        Returns
+        ------
+        member_levels : np.array, shape=(n_members), dtype=int
+            The level each member is binned in, in member id order.
+        """
+        return self._member_levels
+
+    @property
+    def xyz(self):
+        """Returns the positions of the members.
+        Returns
+        ------
+        xyz : np.array, shape=(n_members, 3), dtype=float
+            The position of each member, as it was binned, in member id order.
+        """
+        return self._xyz
+
+    @property
+    def radii(self):
+        """Returns the bounding radius of each member.
+        Returns
+        ------
+        radii : np.array, shape=(n_members), dtype=float
+            The bounding radius of each member, in member id order.
+        """
+        return self._radii
+
+    @property
+    def r_cut(self):
+        """Returns the contact cutoff distance.
+        Returns
+        ------
+        r_cut : float
+            The cutoff distance between the surfaces of the bounding spheres of two members.
+        """
+        return self._r_cut
+
+    @property
+    def n_members(self):
+        """Returns the total number of members.
+        Returns
+        ------
+        n_members : int
+            The number of members in all levels.
+        """
+        return len(self._radii)
@@ -0,0 +1,147 @@
+"""Parallel pair search over blocks of cells, using a pool of processes."""
+
+
+__all__ = ["parallel_pairs_within"]
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .mbuild_cell_list import _backend_kernels, _pairs_in_cells
+
+# the arrays of the cell list that the workers need to find pairs
+_SHARED_ARRAYS = ['xyz', 'sorted_ids', 'cell_start', 'cell_count', 'neighbor_table', 'shift_table', 'box_matrix']
+
+# arrays attached to shared memory within a worker process
+_worker_arrays = {}
+_worker_blocks = []
+
+
+def _share_arrays(arrays):
+    # copy each array into its own shared memory block; returns the blocks and a description
+    # that can be used by the workers to attach to them
+    blocks = []
+    spec = {}
+    try:
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks.append(block)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            spec[name] = (block.name, array.shape, array.dtype.str)
+    except Exception:
+        _release(blocks, unlink=True)
+        raise
+    return blocks, spec
+
+
+def _release(blocks, unlink=False):
+    for block in blocks:
+        block.close()
+        if unlink:
+            block.unlink()
+
+
+def _attach_arrays(spec):
+    # worker initializer: map the shared memory blocks as arrays, without copying them
+    _release(_worker_blocks)
+    _worker_blocks.clear()
+    _worker_arrays.clear()
+    for name, (block_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker_blocks.append(block)
+        _worker_arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def _pairs_in_block(cells, r_cut, half, return_vectors, backend='numpy'):
+    # worker task: find the pairs for the members of a block of cells
+    arrays = _worker_arrays
+    kernels = _backend_kernels(backend)
+    pairs_in_cells = _pairs_in_cells if kernels is None else kernels.pairs_in_cells
+    i, j, distance, vectors = pairs_in_cells(cells, arrays['xyz'], arrays['sorted_ids'], arrays['cell_start'],
+                                             arrays['cell_count'], arrays['neighbor_table'], arrays['shift_table'],
+                                             arrays['box_matrix'], r_cut, half)
+    if return_vectors:
+        return i, j, distance, vectors
+    return i, j, distance
+
+
+def _split_cells(cell_count, n_blocks):
+    # split the occupied cells into contiguous blocks (i.e., slabs of the grid) with a similar number of members
+    occupied = np.nonzero(cell_count)[0]
+    if len(occupied) == 0:
+        return []
+    n_blocks = max(1, min(n_blocks, len(occupied)))
+    cumulative = np.cumsum(cell_count[occupied])
+    bounds = np.searchsorted(cumulative, np.linspace(0, cumulative[-1], n_blocks+1)[1:-1], side='right')
+    return [block for block in np.split(occupied, bounds) if len(block)]
+
+
+def parallel_pairs_within(cell_list, r_cut, n_workers=None, n_blocks=None, return_vectors=False, mp_context=None):
+    """Find all pairs of members within a cutoff, splitting the work over a pool of processes.
+    The cell grid is split into contiguous blocks of cells with a similar number of members, and each block
+    is handled by a worker. The member positions and cell arrays are placed in shared memory, so the workers
+    read them without copying. The results are identical to, and in the same order as, CellList.pairs_within.
+
+    Parameters
+    ----------
+    cell_list : CellList
+        A populated cell list.
+    r_cut : float
+        The cutoff distance; must not be larger than the size of the cells.
+    n_workers : int, optional
+        The number of worker processes; defaults to the number of CPUs.
+    n_blocks : int, optional
+        The number of blocks to split the cells into; defaults to 4 blocks per worker.
+    return_vectors : bool, default=False
+        If True, also return the displacement vector from member i to member j.
+    mp_context : multiprocessing context, optional
+        The context used to start the worker processes.
+
+    Returns
+    ------
+    i : np.ndarray, shape=(n_pairs), dtype=int
+        The member id of the first member of each pair.
+    j : np.ndarray, shape=(n_pairs), dtype=int
+        The member id of the second member of each pair.
+    distance : np.ndarray, shape=(n_pairs), dtype=float
+        The distance between the members of each pair.
+    vectors : np.ndarray, shape=(n_pairs, 3), dtype=float
+        The minimum image displacement from member i to member j; only returned if return_vectors is True.
+    """
+    if r_cut > cell_list.cell_widths.min():
+        raise Exception(f'The cutoff ({r_cut}) cannot be larger than the size of the cells: {cell_list.cell_widths}')
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    if n_blocks is None:
+        n_blocks = 4*n_workers
+
+    cell_list._ensure_csr(merge_pending=True)
+    half = cell_list._list_type == 'half'
+    blocks = _split_cells(cell_list._cell_count, n_blocks)
+
+    results = []
+    if blocks:
+        neighbor_table, shift_table = cell_list._csr_tables()
+        arrays = {'xyz': cell_list.xyz, 'sorted_ids': cell_list._sorted_ids, 'cell_start': cell_list._cell_start,
+                  'cell_count': cell_list._cell_count, 'neighbor_table': neighbor_table,
+                  'shift_table': shift_table, 'box_matrix': cell_list._box_matrix}
+        shared_blocks, spec = _share_arrays(arrays)
+        try:
+            with ProcessPoolExecutor(max_workers=n_workers, mp_context=mp_context,
+                                     initializer=_attach_arrays, initargs=(spec,)) as executor:
+                futures = [executor.submit(_pairs_in_block, block, r_cut, half, return_vectors,
+                                           cell_list.backend) for block in blocks]
+                # collect the results in block order so the output is deterministic
+                results = [future.result() for future in futures]
+        finally:
+            _release(shared_blocks, unlink=True)
+
+    n_outputs = 4 if return_vectors else 3
+    if not results:
+        empty = (np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty(0, dtype=float),
+                 np.empty((0, 3), dtype=float))
+        return empty[:n_outputs]
+    return tuple(np.concatenate([result[k] for result in results]) for k in range(n_outputs))
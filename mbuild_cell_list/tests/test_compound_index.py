@@ -0,0 +1,88 @@
+"""
+Unit and regression test for the CompoundIndex.
+"""
+
+import mbuild_cell_list as mbcl
+import mbuild as mb
+import numpy as np
+
+
+def brute_force_particle_pairs(xyz, compound, box_lengths, r_cut):
+    delta = xyz[None, :, :] - xyz[:, None, :]
+    delta = delta - box_lengths*np.round(delta/box_lengths)
+    distance = np.linalg.norm(delta, axis=2)
+    a, b = np.nonzero((distance <= r_cut) & (compound[:, None] != compound[None, :]))
+    return {(i, j) for i, j in zip(a.tolist(), b.tolist()) if i < j}
+
+def molecules(rng, box_lengths, n_molecules, n_particles):
+    # rigid rods of particles with random orientations
+    argon = mb.Compound(name='Ar', element='Ar', charge=0)
+    compounds = []
+    for k in range(n_molecules):
+        center = rng.random(3)*box_lengths
+        direction = rng.normal(size=3)
+        direction /= np.linalg.norm(direction)
+        molecule = mb.Compound()
+        for step in np.arange(n_particles) - (n_particles-1)/2:
+            temp = mb.clone(argon)
+            temp.translate_to(center + 0.3*step*direction)
+            molecule.add(temp)
+        compounds.append(molecule)
+    return compounds
+
+def test_compound_index_particle_pairs():
+    rng = np.random.default_rng(12345)
+    box_lengths = np.array([8.0, 8.0, 9.0])
+    compounds = molecules(rng, box_lengths, 60, 5)
+    index = mbcl.CompoundIndex(box_lengths.tolist(), r_cut=0.5, level_radii=[0.7])
+    ids = index.insert_compounds(compounds, wrap_pbc=True)
+    assert (ids == np.arange(60)).all()
+    assert index.n_compounds == 60
+    assert index.n_particles == 300
+    assert np.bincount(index.particle_compound).tolist() == [5]*60
+    assert index.get_compounds([3]) == [compounds[3]]
+    assert index.get_particles([7]) == [list(compounds[1].particles())[2]]
+
+    i, j, distance = index.particle_pairs()
+    pairs = {tuple(sorted(pair)) for pair in zip(i.tolist(), j.tolist())}
+    assert len(pairs) == len(i)
+    assert pairs == brute_force_particle_pairs(index.particle_xyz, index.particle_compound, box_lengths, 0.5)
+    assert (index.particle_compound[i] != index.particle_compound[j]).all()
+    assert (distance <= 0.5).all()
+
+    # the particles of the pairs are all within the compound pairs found by the prefilter
+    a, b, _ = index.compound_pairs()
+    compound_pairs = {tuple(sorted(pair)) for pair in zip(a.tolist(), b.tolist())}
+    assert compound_pairs < {(x, y) for x in range(60) for y in range(x+1, 60)}
+    assert {tuple(sorted(pair)) for pair in zip(index.particle_compound[i].tolist(),
+                                                index.particle_compound[j].tolist())} <= compound_pairs
+
+    # neighbors of a single compound agree with the pairs that involve it
+    for compound_id in range(0, 60, 7):
+        p, q, _ = index.particle_neighbors(compound_id)
+        assert (index.particle_compound[p] == compound_id).all()
+        expected = {(x, y) if index.particle_compound[x] == compound_id else (y, x) for x, y in pairs
+                    if compound_id in (index.particle_compound[x], index.particle_compound[y])}
+        assert set(zip(p.tolist(), q.tolist())) == expected
+
+def test_compound_index_prefilter():
+    argon = mb.Compound(name='Ar', element='Ar', charge=0)
+    compounds = []
+    for center in [[1.0, 1.0, 1.0], [2.0, 1.0, 1.0], [6.0, 6.0, 6.0]]:
+        molecule = mb.Compound()
+        for offset in [[-0.4, 0.0, 0.0], [0.4, 0.0, 0.0]]:
+            temp = mb.clone(argon)
+            temp.translate_to(np.array(center) + offset)
+            molecule.add(temp)
+        compounds.append(molecule)
+
+    index = mbcl.CompoundIndex([10.0, 10.0, 10.0], r_cut=0.3, level_radii=[0.5])
+    index.insert_compounds(compounds)
+    assert np.allclose(index.compounds.radii, 0.4)
+    # only the first two molecules are close enough to be compared at the particle level
+    a, b, _ = index.compound_pairs()
+    assert sorted(a.tolist() + b.tolist()) == [0, 1]
+    i, j, distance = index.particle_pairs()
+    assert sorted(i.tolist() + j.tolist()) == [1, 2]
+    assert np.allclose(distance, 0.2)
+    assert len(index.particle_neighbors(2)[0]) == 0
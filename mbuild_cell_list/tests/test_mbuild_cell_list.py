@@ -3,6 +3,8 @@ Unit and regression test for the mbuild_cell_list package.
 """
 
 # Import package, test suite, and other packages as needed
+import pickle
+import subprocess
 import sys
 
 import pytest
@@ -16,6 +18,17 @@ def test_mbuild_cell_list_imported():
     assert "mbuild_cell_list" in sys.modules
     
 
+def test_mbuild_not_imported():
+    """The cell list can be used without importing mbuild, which is only loaded when needed."""
+    code = ("import sys, numpy as np, mbuild_cell_list as mbcl\n"
+            "cell_list = mbcl.CellList.from_cutoff([4.0, 4.0, 4.0], r_cut=1.0)\n"
+            "cell_list.insert_positions(np.random.default_rng(1).random((100, 3))*4.0)\n"
+            "cell_list.pairs_within(1.0)\n"
+            "assert 'mbuild' not in sys.modules\n"
+            "assert cell_list.box_lengths.tolist() == [4.0, 4.0, 4.0]\n")
+    subprocess.run([sys.executable, "-c", code], check=True)
+    
+
 def test_init_cell_list_basic():
     """Examine the minimal size cell list to ensure behavior is as expected"""
     box = mb.Box([3,3,3])
@@ -592,3 +605,863 @@ def test_wrap_particles():
     cell_list.insert_compound_position(temp, wrap_pbc=True)
     assert len(cell_list.members(19)) == 1
 
+
+def test_insert_members_bulk():
+    cell_list = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3], periodicity=[True,True,True], box_min=[0,0,0])
+
+    xyz = np.array([cell.pos for cell in cell_list.cells])
+    members = [f'member_{c}' for c in range(len(xyz))]
+    cells = cell_list.insert_members(members, xyz)
+
+    # the returned cell indices should match cell_containing for each point
+    assert (cells == np.array([cell_list.cell_containing(pos) for pos in xyz])).all()
+    for c, cell in enumerate(cell_list.cells):
+        assert cell_list.members(c) == [f'member_{c}']
+        assert len(cell_list.neighbor_members(c)) == 26
+
+    # positions outside the box can be wrapped
+    cell_list.empty_cells()
+    cells = cell_list.insert_members(['a', 'b'], [[3.5, 0.5, 0.5], [-0.5, 0.5, 0.5]], wrap_pbc=True)
+    assert (cells == np.array([0, 2])).all()
+
+    with pytest.raises(Exception):
+        cell_list.insert_members(['a'], [[3.5, 0.5, 0.5]])
+
+    with pytest.raises(Exception):
+        cell_list.insert_members(['a', 'b'], [[0.5, 0.5, 0.5]])
+
+def test_insert_compound_particles_returns_cells():
+    argon = mb.Compound(name='Ar', element='Ar', charge=0)
+    system = mb.Compound()
+    cell_list = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3], periodicity=[True,True,True], box_min=[0,0,0])
+
+    for c, cell in enumerate(cell_list.cells):
+        temp = mb.clone(argon)
+        temp.translate_to(cell.pos)
+        system.add(temp)
+
+    cells = cell_list.insert_compound_particles(system)
+    assert (cells == np.arange(27)).all()
+    for c, particle in enumerate(system.particles()):
+        assert cell_list.members(c)[0] is particle
+
+def test_insert_positions(tmp_path):
+    cell_list = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3], periodicity=[True,True,True], box_min=[0,0,0])
+    centers = np.array([cell.pos for cell in cell_list.cells])
+
+    # an array (here a read-only memmap) inserted into an empty cell list is used without copying
+    np.save(tmp_path / 'xyz.npy', centers)
+    xyz = np.load(tmp_path / 'xyz.npy', mmap_mode='r')
+    member_ids = cell_list.insert_positions(xyz)
+    assert (member_ids == np.arange(27)).all()
+    assert np.shares_memory(cell_list.xyz, xyz)
+    assert cell_list.members(13) == [13]
+    pairs = cell_list.pairs_within(1.0)
+    assert len(pairs[0]) == 27*6
+
+    # members are labeled by the given ids, and later inserts are copied
+    member_ids = cell_list.insert_positions(centers[:2], ids=[100, 101])
+    assert (member_ids == [27, 28]).all()
+    assert cell_list.members(0) == [0, 100]
+    assert cell_list.get_members(member_ids) == [100, 101]
+    assert not np.shares_memory(cell_list.xyz, xyz)
+
+    # moving a member does not write to the original array
+    cell_list.empty_cells()
+    cell_list.insert_positions(xyz)
+    cell_list.move(0, [2.5, 2.5, 2.5])
+    assert (xyz[0] == centers[0]).all()
+    assert cell_list.members(26) == [26, 0]
+
+    with pytest.raises(Exception):
+        cell_list.insert_positions(centers[:2], ids=[1])
+
+def test_insert_positions_copy():
+    cell_list = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3], periodicity=[True,True,True], box_min=[0,0,0])
+
+    # a writeable array is copied by default, so reusing it (e.g., as a trial buffer) does not change the members
+    trial = np.array([[0.2, 0.5, 0.5], [0.8, 0.5, 0.5]])
+    cell_list.insert_positions(trial)
+    assert not np.shares_memory(cell_list.xyz, trial)
+    trial[:] = 2.5
+    assert cell_list.members(0) == [0, 1]
+    assert np.allclose(cell_list.pairs_within(0.7)[2], 0.6)
+
+    # it is only used in place if asked for
+    cell_list.empty_cells()
+    xyz = np.array([[0.5, 0.5, 0.5], [2.5, 2.5, 2.5]])
+    cell_list.insert_positions(xyz, copy=False)
+    assert np.shares_memory(cell_list.xyz, xyz)
+    cell_list.move(0, [1.5, 1.5, 1.5])
+    assert not np.shares_memory(cell_list.xyz, xyz)
+    assert (xyz[0] == 0.5).all()
+
+def test_insert_compound_particles_snapshot():
+    argon = mb.Compound(name='Ar', element='Ar', charge=0)
+    system = mb.Compound()
+    cell_list = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3], periodicity=[True,True,True], box_min=[0,0,0])
+    for c, cell in enumerate(cell_list.cells):
+        temp = mb.clone(argon)
+        temp.translate_to(cell.pos)
+        system.add(temp)
+
+    # the particles are taken when the Compound is inserted, so later changes to the Compound do not affect them
+    cell_list.insert_compound_particles(system)
+    cell_list.remove(3)
+    particles = list(system.particles())
+    extra = mb.clone(argon)
+    extra.translate_to(cell_list.cells[0].pos)
+    system.add(extra)
+    assert cell_list.members(0) == [particles[0]]
+    assert cell_list.member_id(particles[5]) == 5
+    assert cell_list.get_members([0, 3, 26]) == [particles[0], None, particles[26]]
+
+def test_csr_storage():
+    cell_list = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3], periodicity=[True,True,True], box_min=[0,0,0])
+
+    # insert members in reverse cell order, with two members in cell 13
+    xyz = np.array([cell.pos for cell in cell_list.cells][::-1] + [cell_list.cells[13].pos])
+    cell_list.insert_members(list(range(28)), xyz)
+    assert cell_list.n_members == 28
+
+    # members are sorted by cell, keeping insertion order within a cell
+    assert (cell_list.cell_count == np.array([1]*13 + [2] + [1]*13)).all()
+    assert (cell_list.cell_start == np.cumsum(cell_list.cell_count) - cell_list.cell_count).all()
+    assert cell_list.sorted_ids[0] == 26
+    assert cell_list.members(13) == [13, 27]
+    assert cell_list.cells[13].members == [13, 27]
+    assert [cell.members for cell in cell_list.cells[12:15]] == [[14], [13, 27], [12]]
+    assert len(cell_list.cells[::2]) == 14
+    with pytest.raises(TypeError):
+        cell_list.cells[1.0]
+
+    # neighbor members are returned as a view of the neighboring cells
+    neighbors = cell_list.cells[0].neighbor_members
+    assert len(neighbors) == 27
+    for member, c in neighbors:
+        assert c in cell_list.cells[0].neighbor_cells
+        assert member in cell_list.members(c)
+
+    # adding another member updates the layout the next time it is queried
+    cell_list.insert_members([28], [cell_list.cells[0].pos])
+    assert cell_list.members(0) == [26, 28]
+    assert cell_list.cell_count[0] == 2
+
+    cell_list.empty_cells()
+    assert cell_list.n_members == 0
+    assert cell_list.cell_count.sum() == 0
+
+def test_neighbor_members_cached():
+    cell_list = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3], periodicity=[True,True,True], box_min=[0,0,0],
+                              cache_neighbors=True)
+    cell_list.insert_members(list(range(27)), [cell.pos for cell in cell_list.cells])
+
+    assert len(cell_list.neighbor_members(0)) == 26
+    assert 0 in cell_list._neighbor_cache
+
+    # inserting a member invalidates the cached neighbors that could include it
+    cell_list.insert_members([27], [cell_list.cells[13].pos])
+    assert 0 not in cell_list._neighbor_cache
+    assert len(cell_list.neighbor_members(0)) == 27
+    assert 27 in cell_list.neighbor_members(0)
+    assert cell_list.members(13) == [13, 27]
+
+    cell_list.empty_cells()
+    assert len(cell_list._neighbor_cache) == 0
+    assert len(cell_list.neighbor_members(0)) == 0
+
+def test_insert_single_members_pending():
+    # members inserted one at a time are visible without rebuilding the sorted layout
+    cell_list = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3], periodicity=[True,True,True], box_min=[0,0,0])
+    for c, cell in enumerate(cell_list.cells):
+        cell_list.insert_members([c], [cell.pos])
+        assert cell_list.members(c) == [c]
+        assert len(cell_list.neighbor_members(c)) == len([n for n in cell.neighbor_cells if n < c])
+    assert cell_list._n_pending == 27
+
+    # accessing the sorted layout merges the pending members
+    assert (cell_list.cell_count == 1).all()
+    assert cell_list._n_pending == 0
+    for c in range(27):
+        assert len(cell_list.neighbor_members(c)) == 26
+
+def test_neighbor_tables():
+    for list_type, n_stencil in [('full', 26), ('half', 13)]:
+        cell_list = mbcl.CellList(box=[3.0,4.0,5.0], n_cells=[3,4,5], periodicity=[True,False,True], box_min=[0,0,0],
+                                  list_type=list_type)
+        assert cell_list._neighbor_table.shape == (60, n_stencil)
+        assert cell_list._shift_table.shape == (60, n_stencil, 3)
+        assert len(cell_list.cells) == 60
+
+        for c, cell in enumerate(cell_list.cells):
+            # the shifts should match the minimum image between the cell centers
+            for neigh, shift in cell.neighbor_cells_shift.items():
+                dist = (cell.pos - cell_list.cells[neigh].pos)/np.array(cell_list.box.lengths)
+                assert (np.array(shift) == np.where(dist >= 0.5, 1, np.where(dist < -0.5, -1, 0))).all()
+            assert sorted(cell.neighbor_cells_shift) == sorted(cell.neighbor_cells)
+            # no shifting should happen along the non-periodic dimension
+            assert all(shift[1] == 0 for shift in cell.neighbor_cells_shift.values())
+
+    assert (cell_list.cells[-1].pos == cell_list.cells[59].pos).all()
+    with pytest.raises(IndexError):
+        cell_list.cells[60]
+
+def test_pairs_within():
+    # brute force the minimum image distances to compare against
+    rng = np.random.default_rng(12345)
+    box_lengths = np.array([3.0, 4.0, 5.0])
+    xyz = rng.random((200, 3))*box_lengths
+    periodicity = np.array([True, False, True])
+    delta = xyz[None, :, :] - xyz[:, None, :]
+    delta = np.where(periodicity, delta - box_lengths*np.round(delta/box_lengths), delta)
+    distance = np.linalg.norm(delta, axis=2)
+    a, b = np.nonzero((distance <= 0.8) & ~np.eye(len(xyz), dtype=bool))
+    expected = set(zip(a.tolist(), b.tolist()))
+
+    cell_list = mbcl.CellList(box=box_lengths.tolist(), n_cells=[3,4,5], periodicity=periodicity, list_type='full')
+    cell_list.insert_members(range(len(xyz)), xyz)
+    i, j, dist, vectors = cell_list.pairs_within(0.8, return_vectors=True)
+
+    # the full list reports each pair in both directions
+    assert set(zip(i.tolist(), j.tolist())) == expected
+    assert len(i) == len(expected)
+    assert np.allclose(dist, distance[i, j])
+    assert np.allclose(vectors, delta[i, j])
+
+    # the half list reports each pair exactly once
+    cell_list = mbcl.CellList(box=box_lengths.tolist(), n_cells=[3,4,5], periodicity=periodicity, list_type='half')
+    cell_list.insert_members(range(len(xyz)), xyz)
+    i, j, dist = cell_list.pairs_within(0.8)
+    pairs = {tuple(sorted(pair)) for pair in zip(i.tolist(), j.tolist())}
+    assert len(pairs) == len(i) == len(expected)//2
+    assert pairs == {tuple(sorted(pair)) for pair in expected}
+    assert cell_list.get_members(i[:3]) == i[:3].tolist()
+
+    # the cutoff cannot be larger than the cells
+    with pytest.raises(Exception):
+        cell_list.pairs_within(1.1)
+
+def test_update_positions():
+    rng = np.random.default_rng(12345)
+    box_lengths = np.array([3.0, 4.0, 5.0])
+    xyz = rng.random((100, 3))*box_lengths
+    cell_list = mbcl.CellList(box=box_lengths.tolist(), n_cells=[3,4,5])
+    cells = cell_list.insert_members(range(len(xyz)), xyz)
+
+    # move a few members by a small amount; only those that cross a boundary are relocated
+    for step in range(5):
+        xyz = xyz + rng.normal(0, 0.1, xyz.shape)
+        moved = cell_list.update_positions(xyz, wrap_pbc=True)
+        new_cells = np.array([cell_list.cell_containing(pos) for pos in cell_list.wrap_positions(xyz)])
+        assert (moved == np.nonzero(new_cells != cells)[0]).all()
+        cells = new_cells
+
+        for c in range(cell_list.n_cells_total):
+            assert sorted(cell_list.members(c)) == np.nonzero(cells == c)[0].tolist()
+        assert np.allclose(cell_list.xyz, cell_list.wrap_positions(xyz))
+
+    with pytest.raises(Exception):
+        cell_list.update_positions(xyz[:10])
+
+def test_update_compound():
+    argon = mb.Compound(name='Ar', element='Ar', charge=0)
+    system = mb.Compound()
+    cell_list = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3])
+    for c in range(3):
+        temp = mb.clone(argon)
+        temp.translate_to(cell_list.cells[c].pos)
+        system.add(temp)
+    cell_list.insert_compound_particles(system)
+
+    system.children[0].translate([0.0, 1.0, 0.0])
+    moved = cell_list.update_compound(system)
+    assert moved.tolist() == [0]
+    assert cell_list.members(0) == []
+    assert cell_list.members(3) == [system.children[0]]
+    assert len(cell_list.neighbor_members(4)) == 3
+
+def test_remove_and_move():
+    argon = mb.Compound(name='Ar', element='Ar', charge=0)
+    cell_list = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3])
+
+    compounds = []
+    for c, cell in enumerate(cell_list.cells):
+        temp = mb.clone(argon)
+        temp.translate_to(cell.pos)
+        compounds.append(temp)
+        assert cell_list.insert_compound_position(temp) == c
+
+    # remove a member; the other members keep their ids
+    member_id = cell_list.member_id(compounds[13])
+    assert member_id == 13
+    cell_list.remove(member_id)
+    assert cell_list.n_members == 26
+    assert cell_list.members(13) == []
+    assert len(cell_list.neighbor_members(0)) == 25
+    assert cell_list.member_id(compounds[14]) == 14
+    assert 13 not in cell_list.sorted_ids
+
+    with pytest.raises(Exception):
+        cell_list.remove(member_id)
+    with pytest.raises(Exception):
+        cell_list.member_id(compounds[13])
+
+    # move a member into another cell
+    assert cell_list.move(0, cell_list.cells[13].pos) == 13
+    assert cell_list.members(0) == []
+    assert cell_list.members(13) == [compounds[0]]
+    assert (cell_list.xyz[0] == cell_list.cells[13].pos).all()
+
+    # moving within a cell only updates the position
+    assert cell_list.move(0, cell_list.cells[13].pos + 0.1) == 13
+    assert cell_list.members(13) == [compounds[0]]
+
+    # positions are wrapped when requested
+    assert cell_list.move(1, [4.5, 0.5, 0.5], wrap_pbc=True) == 1
+    with pytest.raises(Exception):
+        cell_list.move(1, [4.5, 0.5, 0.5])
+
+    # removed members are skipped when updating positions
+    xyz = np.array(cell_list.xyz)
+    xyz[13] = [100.0, 100.0, 100.0]
+    assert len(cell_list.update_positions(xyz)) == 0
+    # or only the positions of the members that are in the cell list are given
+    assert len(cell_list.update_positions(np.delete(xyz, 13, axis=0))) == 0
+
+    # the id of a removed member is reused by the next insertion
+    temp = mb.clone(argon)
+    temp.translate_to(cell_list.cells[5].pos)
+    assert cell_list.insert_compound_position(temp) == 13
+    assert cell_list.member_id(temp) == 13
+    assert cell_list.members(5) == [compounds[5], temp]
+    assert cell_list.n_members == 27
+    assert (cell_list.member_ids == np.arange(27)).all()
+
+def test_upper_face_binning():
+    # a point on the upper face of the box belongs to the last cell, whichever path bins it
+    xyz = np.array([[0.1, 0.5, 0.5], [1.5, 0.5, 0.5]])
+    face = np.array([3.0, 0.5, 0.5])
+    cell_list = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3], list_type='half')
+    cell_list.insert_positions(xyz)
+    assert cell_list.cell_containing(face) == 2
+    assert cell_list.move(1, face) == 2
+    i, j, _ = cell_list.pairs_within(0.5)
+    assert sorted(zip(i.tolist(), j.tolist())) == [(0, 1)]
+
+    inserted = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3], list_type='half')
+    inserted.insert_positions(np.array([xyz[0], face]))
+    assert inserted._member_cells[1] == 2
+    updated = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3], list_type='half')
+    updated.insert_positions(xyz)
+    updated.update_positions(np.array([xyz[0], face]))
+    assert updated._member_cells[1] == 2
+
+    argon = mb.Compound(name='Ar', element='Ar', charge=0)
+    argon.translate_to(face)
+    compounds = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3])
+    member_id = compounds.insert_compound_position(argon)
+    assert compounds._member_cells[member_id] == 2
+
+def test_reuse_removed_ids():
+    # grand canonical style removals and insertions keep the member storage at the number of members
+    rng = np.random.default_rng(12345)
+    cell_list = mbcl.CellList.from_cutoff([6.0, 6.0, 6.0], r_cut=1.0)
+    cell_list.insert_positions(rng.random((100, 3))*6.0)
+    for step in range(2000):
+        live = cell_list.member_ids
+        cell_list.remove(int(rng.choice(live)))
+        new_id = cell_list.insert_positions(rng.random((1, 3))*6.0)
+        assert new_id[0] < 100
+    assert cell_list.n_members == 100
+    assert len(cell_list.xyz) == 100
+    assert cell_list.get_members(cell_list.member_ids) == list(range(100))
+
+    # several removals are reused, most recent first, before new ids are added
+    for member_id in [10, 20, 30]:
+        cell_list.remove(member_id)
+    member_ids = cell_list.insert_positions(rng.random((5, 3))*6.0, ids=[-1, -2, -3, -4, -5])
+    assert member_ids.tolist() == [30, 20, 10, 100, 101]
+    assert cell_list.get_members(member_ids) == [-1, -2, -3, -4, -5]
+    i, j, distance = cell_list.pairs_within(1.0)
+    delta = cell_list.xyz[None, :, :] - cell_list.xyz[:, None, :]
+    delta -= 6.0*np.round(delta/6.0)
+    a, b = np.nonzero((np.linalg.norm(delta, axis=2) <= 1.0) & ~np.eye(102, dtype=bool))
+    assert set(zip(i.tolist(), j.tolist())) == set(zip(a.tolist(), b.tolist()))
+
+def test_from_cutoff():
+    box = mb.Box([3.0, 4.0, 5.5])
+    cell_list = mbcl.CellList.from_cutoff(box, r_cut=0.5)
+    assert (cell_list.n_cells == np.array([6, 8, 11])).all()
+    assert (cell_list.cell_sizes >= 0.5).all()
+    assert cell_list.box == box
+
+    cell_list = mbcl.CellList.from_cutoff([3.0, 4.0, 5.5], r_cut=0.5, periodicity=[True, False, True],
+                                          list_type='half')
+    assert (cell_list.periodicity == np.array([True, False, True])).all()
+    assert len(cell_list.cells[0].neighbor_cells) <= 13
+
+    # a target occupancy results in fewer, larger cells
+    cell_list = mbcl.CellList.from_cutoff([10.0, 10.0, 10.0], r_cut=0.5, target_occupancy=10, n_members=1000)
+    assert (cell_list.n_cells == np.array([4, 4, 4])).all()
+
+    # cells can not be made smaller than the cutoff to reach the occupancy
+    cell_list = mbcl.CellList.from_cutoff([3.0, 3.0, 3.0], r_cut=0.5, target_occupancy=0.001, n_members=1000)
+    assert (cell_list.n_cells == np.array([6, 6, 6])).all()
+
+    # fall back to 3 cells if the box is too small, with a warning
+    with pytest.warns(UserWarning):
+        cell_list = mbcl.CellList.from_cutoff([3.0, 1.0, 3.0], r_cut=0.5)
+    assert (cell_list.n_cells == np.array([6, 3, 6])).all()
+
+    with pytest.raises(Exception):
+        mbcl.CellList.from_cutoff([3.0, 3.0, 3.0], r_cut=0.0)
+    with pytest.raises(Exception):
+        mbcl.CellList.from_cutoff([3.0, 3.0, 3.0], r_cut=0.5, target_occupancy=10)
+
+def test_cells_containing():
+    cell_list = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3], periodicity=[True,True,False], box_min=[0,0,0])
+
+    xyz = np.array([cell.pos for cell in cell_list.cells])
+    assert (cell_list.cells_containing(xyz) == np.arange(27)).all()
+
+    # points outside the box are flagged rather than raising an exception
+    points = np.array([[0.5, 0.5, 0.5], [3.5, 0.5, 0.5], [0.5, 0.5, 3.5], [-0.5, 2.5, 2.5], [3.0, 3.0, 3.0]])
+    cells, outside = cell_list.cells_containing(points, return_outside=True)
+    assert cells.tolist() == [0, -1, -1, -1, 26]
+    assert outside.tolist() == [False, True, True, True, False]
+
+    # wrapping brings points back in, except along the non-periodic dimension
+    cells, outside = cell_list.cells_containing(points, wrap_pbc=True, return_outside=True)
+    assert cells.tolist() == [0, 0, -1, 26, 18]
+    assert outside.tolist() == [False, False, True, False, False]
+
+    # the vectorized wrapping matches wrapping one point at a time
+    rng = np.random.default_rng(12345)
+    points = rng.random((100, 3))*12.0 - 6.0
+    wrapped = cell_list.wrap_positions(points)
+    for point, wrapped_point in zip(points, wrapped):
+        assert np.allclose(cell_list._wrap_position(point), wrapped_point)
+
+def test_triclinic_box():
+    box = mb.Box([4.0, 4.5, 5.0], angles=[70.0, 80.0, 100.0])
+    cell_list = mbcl.CellList.from_cutoff(box, r_cut=1.0, box_min=[0.5, -1.0, 2.0])
+    assert (cell_list.cell_widths >= 1.0).all()
+    assert (cell_list.cell_widths < cell_list.cell_sizes).all()
+    box_matrix = cell_list.box_matrix
+    assert np.allclose(np.linalg.norm(box_matrix, axis=1), box.lengths)
+
+    # each cell center should be inside of its own cell
+    centers = np.array([cell.pos for cell in cell_list.cells])
+    assert (cell_list.cells_containing(centers) == np.arange(cell_list.n_cells_total)).all()
+    assert cell_list.cell_containing(centers[5]) == 5
+
+    rng = np.random.default_rng(12345)
+    xyz = rng.random((200, 3)) @ box_matrix + cell_list._box_min
+    cell_list.insert_members(range(len(xyz)), xyz)
+
+    # points are wrapped along the box vectors
+    images = rng.integers(-2, 3, size=(200, 3)) @ box_matrix
+    assert np.allclose(cell_list.wrap_positions(xyz + images), xyz)
+    assert (cell_list.cells_containing(xyz + images, wrap_pbc=True) == cell_list.cells_containing(xyz)).all()
+
+    # compare to the brute force minimum image distance, checking all 27 images
+    offsets = np.array([[x, y, z] for x in range(-1, 2) for y in range(-1, 2) for z in range(-1, 2)]) @ box_matrix
+    delta = xyz[None, :, None, :] - xyz[:, None, None, :] + offsets[None, None, :, :]
+    distance = np.linalg.norm(delta, axis=3).min(axis=2)
+    a, b = np.nonzero((distance <= 1.0) & ~np.eye(len(xyz), dtype=bool))
+
+    i, j, dist = cell_list.pairs_within(1.0)
+    assert set(zip(i.tolist(), j.tolist())) == set(zip(a.tolist(), b.tolist()))
+    assert len(i) == len(a)
+    assert np.allclose(dist, distance[i, j])
+
+@pytest.mark.parametrize("list_type", ['full', 'half'])
+@pytest.mark.parametrize("periodicity", [[True,True,True], [True,False,True], [False,False,False]])
+@pytest.mark.parametrize("angles", [[90.0,90.0,90.0], [70.0,80.0,100.0]])
+def test_backends_identical(list_type, periodicity, angles):
+    pytest.importorskip("numba")
+    box = mb.Box([4.0, 4.5, 5.0], angles=angles)
+    rng = np.random.default_rng(12345)
+    cell_lists = {}
+    for backend in ['numpy', 'numba']:
+        cell_list = mbcl.CellList.from_cutoff(box, r_cut=1.0, periodicity=periodicity, box_min=[0.5, -1.0, 2.0],
+                                              list_type=list_type, backend=backend)
+        assert cell_list.backend == backend
+        cell_lists[backend] = cell_list
+    box_matrix = cell_lists['numpy'].box_matrix
+    xyz = rng.random((300, 3)) @ box_matrix + [0.5, -1.0, 2.0]
+    # include points outside of the box, and on its faces
+    points = np.concatenate([xyz, xyz + rng.integers(-1, 2, size=(300, 3)) @ box_matrix,
+                             np.array([[0.5, -1.0, 2.0]]), np.array([[0.5, -1.0, 2.0]]) + box_matrix.sum(axis=0)])
+
+    results = {}
+    for backend, cell_list in cell_lists.items():
+        cell_list.insert_members(range(len(xyz)), xyz)
+        cell_list.remove(7)
+        cell_list.move(11, xyz[50])
+        results[backend] = {'cells': cell_list.cells_containing(points, return_outside=True),
+                            'wrapped': cell_list.cells_containing(points, wrap_pbc=True),
+                            'sorted_ids': cell_list.sorted_ids,
+                            'cell_start': cell_list.cell_start,
+                            'cell_count': cell_list.cell_count,
+                            'pairs': cell_list.pairs_within(1.0, return_vectors=True)}
+
+    numpy_results, numba_results = results['numpy'], results['numba']
+    for key in ['cells', 'pairs']:
+        for numpy_array, numba_array in zip(numpy_results.pop(key), numba_results.pop(key)):
+            assert np.array_equal(numpy_array, numba_array)
+    for key in numpy_results:
+        assert np.array_equal(numpy_results[key], numba_results[key])
+
+def test_backend_options(monkeypatch):
+    with pytest.raises(Exception):
+        mbcl.CellList(box=[3,3,3], backend='fortran')
+
+    # without numba the numpy backend is used
+    monkeypatch.setitem(sys.modules, 'numba', None)
+    monkeypatch.setitem(sys.modules, 'mbuild_cell_list._numba_kernels', None)
+    monkeypatch.delattr(mbcl, '_numba_kernels', raising=False)
+    with pytest.warns(UserWarning):
+        cell_list = mbcl.CellList(box=[3,3,3], backend='numba')
+    assert cell_list.backend == 'numpy'
+
+def test_stats():
+    cell_list = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3], periodicity=[True,True,True], box_min=[0,0,0])
+    xyz = np.array([cell_list.cells[0].pos]*3 + [cell_list.cells[13].pos])
+    cell_list.insert_positions(xyz)
+
+    stats = cell_list.stats()
+    assert stats['n_members'] == 4
+    assert stats['n_cells_total'] == 27
+    assert stats['occupancy_histogram'].tolist() == [25, 1, 0, 1]
+    assert stats['max_occupancy'] == 3
+    assert stats['mean_occupancy'] == 4/27
+    assert stats['empty_fraction'] == 25/27
+    assert stats['memory_bytes'] > cell_list._neighbor_table.nbytes
+    # cells 0 and 13 are neighbors, so the 3 members of cell 0 are checked against each other and the member of cell 13
+    assert stats['candidate_pairs'] == 3*2 + 2*3*1
+    assert len(cell_list.pairs_within(1.0)[0]) <= stats['candidate_pairs']
+    assert 'timings' not in stats
+
+    half_list = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3], list_type='half')
+    half_list.insert_positions(xyz)
+    assert half_list.stats()['candidate_pairs'] == 3 + 3
+
+def test_profiling():
+    cell_list = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3], profile=True)
+    assert cell_list.profiling
+    assert cell_list.timings['_init_grid']['calls'] == 1
+
+    cell_list.insert_positions(np.array([cell.pos for cell in cell_list.cells]))
+    cell_list.pairs_within(1.0)
+    cell_list.pairs_within(1.0)
+    timings = cell_list.stats()['timings']
+    assert timings['pairs_within']['calls'] == 2
+    assert timings['insert_positions']['calls'] == 1
+    assert timings['pairs_within']['time'] > 0
+
+    # disabling removes the wrappers, but keeps the timings
+    cell_list.disable_profiling()
+    assert not cell_list.profiling
+    assert 'pairs_within' not in vars(cell_list)
+    cell_list.pairs_within(1.0)
+    assert cell_list.timings['pairs_within']['calls'] == 2
+    cell_list.reset_timings()
+    assert cell_list.timings == {}
+
+    cell_list = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3])
+    assert not cell_list.profiling
+    cell_list.enable_profiling()
+    cell_list.members(0)
+    assert cell_list.timings == {'members': {'calls': 1, 'time': cell_list.timings['members']['time']}}
+
+def test_profiling_pickle():
+    # a profiled cell list can be sent to worker processes; it is still profiled once unpickled
+    cell_list = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3], list_type='half', profile=True)
+    cell_list.insert_positions(np.array([cell.pos for cell in cell_list.cells]))
+    cell_list.pairs_within(1.0)
+
+    loaded = pickle.loads(pickle.dumps(cell_list))
+    assert loaded.profiling
+    assert loaded.timings['pairs_within']['calls'] == 1
+    for expected, found in zip(cell_list.pairs_within(1.0), loaded.pairs_within(1.0)):
+        assert (expected == found).all()
+    # the wrappers time the unpickled list, not the original
+    assert loaded.timings['pairs_within']['calls'] == 2
+    assert cell_list.timings['pairs_within']['calls'] == 2
+    loaded.members(0)
+    assert 'members' not in cell_list.timings
+
+    cell_list.disable_profiling()
+    assert not pickle.loads(pickle.dumps(cell_list)).profiling
+
+@pytest.mark.parametrize("mmap_mode", ['r', None])
+def test_save_load(tmp_path, mmap_mode):
+    rng = np.random.default_rng(12345)
+    box = mb.Box([4.0, 4.5, 5.0], angles=[70.0, 80.0, 100.0])
+    cell_list = mbcl.CellList.from_cutoff(box, r_cut=1.0, periodicity=[True,False,True], list_type='half')
+    xyz = rng.random((200, 3)) @ cell_list.box_matrix
+    cell_list.insert_positions(xyz, ids=np.arange(200)+1000)
+    cell_list.remove(5)
+    cell_list.save(tmp_path / 'cell_list')
+
+    loaded = mbcl.CellList.load(tmp_path / 'cell_list', mmap_mode=mmap_mode)
+    if mmap_mode is not None:
+        assert isinstance(loaded._neighbor_table, np.memmap)
+    assert (loaded.n_cells == cell_list.n_cells).all()
+    assert np.allclose(loaded.box_matrix, cell_list.box_matrix)
+    assert (loaded.periodicity == cell_list.periodicity).all()
+    assert loaded.n_members == 199
+    assert (loaded.sorted_ids == cell_list.sorted_ids).all()
+    assert (loaded._shift_table == cell_list._shift_table).all()
+    for expected, found in zip(cell_list.pairs_within(1.0), loaded.pairs_within(1.0)):
+        assert (expected == found).all()
+    assert loaded.members(3) == cell_list.members(3)
+    assert loaded.get_members([4, 5, 6]) == [1004, None, 1006]
+
+    # the loaded cell list can be modified without changing the saved files
+    loaded.move(0, xyz[1])
+    loaded.remove(1)
+    loaded.insert_positions(xyz[:3])
+    assert loaded.n_members == 201
+    assert loaded._member_cells[0] == loaded.cell_containing(xyz[1])
+    reloaded = mbcl.CellList.load(tmp_path / 'cell_list')
+    assert (reloaded.sorted_ids == cell_list.sorted_ids).all()
+    assert (reloaded.xyz == cell_list.xyz).all()
+
+    # an empty cell list, with members that are not labeled by integers
+    empty = mbcl.CellList(box=[3.0,3.0,3.0])
+    empty.save(tmp_path / 'empty')
+    loaded = mbcl.CellList.load(tmp_path / 'empty', mmap_mode=mmap_mode)
+    assert loaded.n_members == 0
+    loaded.insert_members(['a'], [[0.5, 0.5, 0.5]])
+    assert loaded.members(0) == ['a']
+
+    empty.insert_members(['a'], [[0.5, 0.5, 0.5]])
+    empty.save(tmp_path / 'objects')
+    loaded = mbcl.CellList.load(tmp_path / 'objects', mmap_mode=mmap_mode)
+    assert loaded.members(0) == [0]
+
+def test_stream():
+    rng = np.random.default_rng(12345)
+    box_lengths = np.array([4.0, 4.0, 5.0])
+    xyz = rng.random((200, 3))*box_lengths
+    frames = [xyz]
+    for step in range(5):
+        frames.append(frames[-1] + rng.normal(scale=0.2, size=xyz.shape))
+
+    cell_list = mbcl.CellList.from_cutoff(box_lengths.tolist(), r_cut=1.0)
+    results = list(cell_list.stream(frames, r_cut=1.0, wrap_pbc=True))
+    assert len(results) == len(frames)
+    for frame, (i, j, distance) in zip(frames, results):
+        expected = mbcl.CellList.from_cutoff(box_lengths.tolist(), r_cut=1.0)
+        expected.insert_members(range(len(frame)), frame, wrap_pbc=True)
+        expected_i, expected_j, _ = expected.pairs_within(1.0)
+        assert set(zip(i.tolist(), j.tolist())) == set(zip(expected_i.tolist(), expected_j.tolist()))
+
+    # the storage is reused between frames
+    storage = cell_list._member_cells
+    counts = list(cell_list.stream(frames[1:], query='cell_count', wrap_pbc=True))
+    assert cell_list._member_cells is storage
+    assert all(count.sum() == 200 for count in counts)
+    assert list(cell_list.stream(frames[:1], query=lambda cl: cl.n_members)) == [200]
+
+    # invalid arguments are reported when stream is called
+    with pytest.raises(Exception):
+        cell_list.stream(frames, query='n_pairs')
+    with pytest.raises(Exception):
+        cell_list.stream(frames, query='unknown')
+
+def test_stream_compound():
+    argon = mb.Compound(name='Ar', element='Ar', charge=0)
+    system = mb.Compound()
+    cell_list = mbcl.CellList(box=[3.0,3.0,3.0], n_cells=[3,3,3])
+    for c, cell in enumerate(cell_list.cells):
+        temp = mb.clone(argon)
+        temp.translate_to(cell.pos)
+        system.add(temp)
+
+    def frames():
+        for step in range(3):
+            yield system
+            system.update_xyz((system.xyz + 1.0) % 3.0)
+
+    n_pairs = list(cell_list.stream(frames(), query='n_pairs', r_cut=1.0))
+    assert n_pairs == [27*6]*3
+    # after two updates, the particle that started in cell 0 has moved to cell 26
+    assert cell_list.members(26) == [list(system.particles())[0]]
+
+@pytest.mark.parametrize("periodicity", [[True,True,True], [True,False,True]])
+def test_half_pairs(periodicity):
+    rng = np.random.default_rng(12345)
+    box = mb.Box([4.0, 4.5, 5.0], angles=[70.0, 80.0, 100.0])
+    full_list = mbcl.CellList.from_cutoff(box, r_cut=1.0, periodicity=periodicity, list_type='full')
+    half_list = mbcl.CellList.from_cutoff(box, r_cut=1.0, periodicity=periodicity, list_type='half')
+    xyz = rng.random((300, 3)) @ full_list.box_matrix
+    full_list.insert_positions(xyz)
+    half_list.insert_positions(xyz)
+
+    # a full list gives the same unique pairs as a half list
+    i, j, distance = full_list.half_pairs(1.0)
+    for expected, found in zip(half_list.pairs_within(1.0), (i, j, distance)):
+        assert (expected == found).all()
+    for expected, found in zip(half_list.half_pairs(1.0), (i, j, distance)):
+        assert (expected == found).all()
+    full_i, full_j, _ = full_list.pairs_within(1.0)
+    assert len(full_i) == 2*len(i)
+    unique = {pair for pair in zip(full_i.tolist(), full_j.tolist()) if pair[0] < pair[1]}
+    assert {tuple(sorted(pair)) for pair in zip(i.tolist(), j.tolist())} == unique
+
+    # each candidate pair is visited once, and the pairs within the cutoff match half_pairs
+    candidates = []
+    within = []
+    for c, ci, cj, images in full_list.iter_cell_pairs():
+        assert (full_list._member_cells[ci] == c).all()
+        candidates.extend(tuple(sorted(pair)) for pair in zip(ci.tolist(), cj.tolist()))
+        d = np.linalg.norm(xyz[cj] + images - xyz[ci], axis=1)
+        within.extend(zip(ci[d <= 1.0].tolist(), cj[d <= 1.0].tolist()))
+    assert len(candidates) == len(set(candidates)) == full_list.stats()['candidate_pairs']//2
+    assert within == list(zip(i.tolist(), j.tolist()))
+
+@pytest.mark.parametrize("cache_neighbors", [False, True])
+def test_neighbor_ids_and_shifts(cache_neighbors):
+    rng = np.random.default_rng(12345)
+    box = mb.Box([4.0, 4.5, 5.0], angles=[70.0, 80.0, 100.0])
+    cell_list = mbcl.CellList.from_cutoff(box, r_cut=1.0, periodicity=[True,False,True],
+                                          cache_neighbors=cache_neighbors)
+    xyz = rng.random((300, 3)) @ cell_list.box_matrix
+    cell_list.insert_members(list(range(300)), xyz)
+    assert cell_list.neighbor_table.shape == (cell_list.n_cells_total, 26)
+    assert cell_list.shift_table.shape == (cell_list.n_cells_total, 26, 3)
+
+    for c in range(cell_list.n_cells_total):
+        ids, shifts, shifted = cell_list.neighbor_ids_and_shifts(c, return_xyz=True)
+        expected = cell_list.neighbor_members_and_min_image_shift(c)
+        assert ids.tolist() == [member for member, _ in expected]
+        assert shifts.shape == (len(ids), 3)
+        assert (shifts == np.array([shift for _, shift in expected]).reshape(-1, 3)).all()
+        assert np.allclose(shifted, xyz[ids] + shifts @ cell_list.box_matrix)
+        # the shifted positions are within the neighboring cells, i.e., less than 2 cells from the center of c
+        center = cell_list.cells[c].pos
+        assert (np.abs((shifted - center) @ np.linalg.inv(cell_list.box_matrix)*cell_list.n_cells) < 2).all()
+
+@pytest.mark.parametrize("list_type", ['full', 'half'])
+@pytest.mark.parametrize("periodicity", [[True,True,True], [True,False,False]])
+def test_has_overlap_and_any_within(list_type, periodicity):
+    rng = np.random.default_rng(12345)
+    box = mb.Box([4.0, 4.5, 5.0], angles=[70.0, 80.0, 100.0])
+    cell_list = mbcl.CellList.from_cutoff(box, r_cut=1.0, periodicity=periodicity, list_type=list_type)
+    box_matrix = cell_list.box_matrix
+    offsets = np.array([[x, y, z] for x in range(-1, 2) for y in range(-1, 2) for z in range(-1, 2)])
+    offsets = (offsets*cell_list.periodicity) @ box_matrix
+
+    def brute_force(points, xyz, r):
+        delta = xyz[None, :, None, :] - points[:, None, None, :] + offsets[None, None, :, :]
+        return (np.linalg.norm(delta, axis=3).min(axis=2) <= r).any(axis=1)
+
+    # build the layout, then add members one at a time so some are pending
+    xyz = rng.random((150, 3)) @ box_matrix
+    cell_list.insert_positions(xyz[:100])
+    cell_list.pairs_within(0.5)
+    for pos in xyz[100:]:
+        cell_list.insert_positions(pos[None, :])
+    assert cell_list._n_pending > 0
+
+    points = rng.random((200, 3)) @ box_matrix
+    expected = brute_force(points, xyz, 0.6)
+    assert 0 < expected.sum() < len(points)
+    assert [cell_list.has_overlap(point, 0.6) for point in points] == expected.tolist()
+    assert (cell_list.any_within(points, 0.6) == expected).all()
+    assert cell_list.has_overlap(xyz[120], 0.1)
+
+    with pytest.raises(Exception):
+        cell_list.has_overlap(points[0], 2.0)
+
+def test_random_packing():
+    # place non-overlapping members one at a time
+    rng = np.random.default_rng(12345)
+    cell_list = mbcl.CellList.from_cutoff([6.0, 6.0, 6.0], r_cut=1.0)
+    for trial in range(2000):
+        pos = rng.random(3)*6.0
+        if not cell_list.has_overlap(pos, 1.0):
+            cell_list.insert_positions(pos[None, :])
+    assert cell_list.n_members > 50
+    assert len(cell_list.pairs_within(1.0)[0]) == 0
+
+def test_points_within():
+    rng = np.random.default_rng(12345)
+    box_lengths = np.array([3.0, 4.0, 5.0])
+    xyz = rng.random((200, 3))*box_lengths
+    cell_list = mbcl.CellList(box=box_lengths.tolist(), n_cells=[3,4,5], periodicity=[True,False,True],
+                              list_type='half')
+    cell_list.insert_positions(xyz)
+
+    points = rng.random((50, 3))*box_lengths
+    found_points, ids, distance, vectors = cell_list.points_within(points, 0.8, return_vectors=True)
+    delta = xyz[None, :, :] - points[:, None, :]
+    delta[..., [0, 2]] -= box_lengths[[0, 2]]*np.round(delta[..., [0, 2]]/box_lengths[[0, 2]])
+    a, b = np.nonzero(np.linalg.norm(delta, axis=2) <= 0.8)
+    assert set(zip(found_points.tolist(), ids.tolist())) == set(zip(a.tolist(), b.tolist()))
+    assert len(ids) == len(a)
+    assert np.allclose(vectors, delta[found_points, ids])
+    assert np.allclose(distance, np.linalg.norm(vectors, axis=1))
+
+@pytest.mark.parametrize("list_type", ['full', 'half'])
+def test_sparse(list_type):
+    # a slab in a mostly empty box gives the same results whether or not only the occupied cells are stored
+    rng = np.random.default_rng(12345)
+    box = mb.Box([6.0, 6.0, 12.0], angles=[90.0, 90.0, 100.0])
+    kwargs = {'n_cells': [6, 6, 12], 'periodicity': [True, True, False], 'list_type': list_type}
+    dense = mbcl.CellList(box, **kwargs)
+    sparse = mbcl.CellList(box, sparse=True, **kwargs)
+    assert sparse.sparse and not dense.sparse
+    xyz = (rng.random((300, 3))*[1.0, 1.0, 0.2]) @ dense.box_matrix
+    for cell_list in [dense, sparse]:
+        cell_list.insert_positions(xyz)
+        cell_list.insert_positions(xyz[:5] + 0.1)
+        cell_list.remove(7)
+        cell_list.move(8, xyz[0] + [0.0, 0.0, 5.0])
+
+    assert len(sparse.cell_count) == len(sparse.occupied_cells) + 1
+    assert (sparse.occupied_cells == dense.occupied_cells).all()
+    assert (sparse.cell_count[:-1] == dense.cell_count[dense.occupied_cells]).all()
+    for expected, found in [(dense.pairs_within(0.9), sparse.pairs_within(0.9)),
+                            (dense.half_pairs(0.9), sparse.half_pairs(0.9))]:
+        for a, b in zip(expected, found):
+            assert (a == b).all()
+    for c in sparse.occupied_cells.tolist() + [0, 431]:
+        assert sparse.members(c) == dense.members(c)
+        assert sparse.cells[c].neighbor_cells_shift == dense.cells[c].neighbor_cells_shift
+        assert np.allclose(sparse.cells[c].pos, dense.cells[c].pos)
+        for a, b in zip(dense.neighbor_ids_and_shifts(c), sparse.neighbor_ids_and_shifts(c)):
+            assert (a == b).all()
+
+    points = rng.random((50, 3)) @ dense.box_matrix
+    for a, b in zip(dense.points_within(points, 0.8), sparse.points_within(points, 0.8)):
+        assert (a == b).all()
+    assert [dense.has_overlap(point, 0.5) for point in points] == [sparse.has_overlap(point, 0.5) for point in points]
+    dense_stats, sparse_stats = dense.stats(), sparse.stats()
+    assert (dense_stats['occupancy_histogram'] == sparse_stats['occupancy_histogram']).all()
+    assert dense_stats['candidate_pairs'] == sparse_stats['candidate_pairs']
+    assert sparse_stats['memory_bytes'] < dense_stats['memory_bytes']/2
+    with pytest.raises(Exception):
+        sparse.neighbor_table
+
+def test_sparse_fine_grid(tmp_path):
+    # a grid of 10^9 cells only stores the cells that hold members
+    rng = np.random.default_rng(12345)
+    cell_list = mbcl.CellList([100.0, 100.0, 100.0], n_cells=[1000, 1000, 1000], sparse=True)
+    xyz = rng.random((2000, 3))*[100.0, 100.0, 1.0]
+    cell_list.insert_positions(xyz)
+    assert cell_list.stats()['memory_bytes'] < 1e6
+    i, j, distance = cell_list.pairs_within(0.1)
+    delta = xyz[None, :, :] - xyz[:, None, :]
+    delta -= 100.0*np.round(delta/100.0)
+    a, b = np.nonzero((np.linalg.norm(delta, axis=2) <= 0.1) & ~np.eye(len(xyz), dtype=bool))
+    assert set(zip(i.tolist(), j.tolist())) == set(zip(a.tolist(), b.tolist()))
+
+    cell_list.save(tmp_path)
+    loaded = mbcl.CellList.load(tmp_path)
+    assert loaded.sparse
+    for a, b in zip(cell_list.pairs_within(0.1), loaded.pairs_within(0.1)):
+        assert (a == b).all()
@@ -0,0 +1,101 @@
+"""
+Unit and regression test for the MultiResolutionCellList.
+"""
+
+import pytest
+
+import mbuild_cell_list as mbcl
+import mbuild as mb
+import numpy as np
+
+
+def brute_force_contacts(xyz, radii, box_lengths, r_cut):
+    delta = xyz[None, :, :] - xyz[:, None, :]
+    delta = delta - box_lengths*np.round(delta/box_lengths)
+    distance = np.linalg.norm(delta, axis=2)
+    a, b = np.nonzero((distance <= radii[:, None] + radii[None, :] + r_cut) & ~np.eye(len(xyz), dtype=bool))
+    return {(i, j) for i, j in zip(a.tolist(), b.tolist()) if i < j}
+
+def mixture(rng, box_lengths):
+    # many small members, some medium and a few large ones
+    radii = np.concatenate([np.full(400, 0.1), rng.uniform(0.2, 1.0, 30), rng.uniform(1.5, 2.0, 4)])
+    xyz = rng.random((len(radii), 3))*box_lengths
+    return xyz, radii
+
+def test_multi_resolution_contacts():
+    rng = np.random.default_rng(12345)
+    box_lengths = np.array([15.0, 15.0, 16.0])
+    xyz, radii = mixture(rng, box_lengths)
+    cell_list = mbcl.MultiResolutionCellList(box_lengths.tolist(), r_cut=0.3, level_radii=[0.1, 1.0, 2.0])
+    ids = cell_list.insert_positions(xyz, radii)
+    assert (ids == np.arange(len(xyz))).all()
+    assert cell_list.n_members == len(xyz)
+    assert np.bincount(cell_list.member_levels).tolist() == [400, 30, 4]
+    assert [level.n_members for level in cell_list.levels] == [400, 30, 4]
+    # the small members use much finer cells than the large ones
+    assert (cell_list.levels[0].cell_widths < cell_list.levels[2].cell_widths/3).all()
+
+    i, j, distance = cell_list.contacts()
+    pairs = {tuple(sorted(pair)) for pair in zip(i.tolist(), j.tolist())}
+    assert len(pairs) == len(i)
+    assert pairs == brute_force_contacts(xyz, radii, box_lengths, 0.3)
+    assert (cell_list.member_levels[i] <= cell_list.member_levels[j]).all()
+
+    # neighbors of a sphere at any size
+    for radius in [0.0, 0.5, 1.8]:
+        for pos in rng.random((5, 3))*box_lengths:
+            found, distance = cell_list.neighbors(pos, radius)
+            delta = xyz - pos
+            delta = delta - box_lengths*np.round(delta/box_lengths)
+            expected = np.nonzero(np.linalg.norm(delta, axis=1) <= radii + radius + 0.3)[0]
+            assert sorted(found.tolist()) == expected.tolist()
+
+    with pytest.raises(Exception):
+        cell_list.insert_positions([[1.0, 1.0, 1.0]], [2.5])
+    with pytest.raises(Exception):
+        mbcl.MultiResolutionCellList(box_lengths.tolist(), r_cut=0.3, level_radii=[1.0, 0.1])
+    # the box cannot fit 3 cells of 2*2.0 + 0.3 for the coarsest level
+    with pytest.raises(Exception):
+        mbcl.MultiResolutionCellList([6.0, 6.0, 6.0], r_cut=0.3, level_radii=[0.3, 2.0])
+
+def test_multi_resolution_neighbors_finer_levels():
+    # a large sphere only looks at the cells of the finer levels that are within its reach
+    rng = np.random.default_rng(12345)
+    box_lengths = np.array([15.0, 15.0, 16.0])
+    xyz, radii = mixture(rng, box_lengths)
+    cell_list = mbcl.MultiResolutionCellList(box_lengths.tolist(), r_cut=0.3, level_radii=[0.1, 1.0, 2.0])
+    cell_list.insert_positions(xyz, radii)
+    fine = cell_list.levels[0]
+    pos = np.array([7.0, 7.0, 7.0])
+    assert len(fine._members_near(pos, 2.4)) < fine.n_members/4
+
+    for pos in rng.random((10, 3))*box_lengths:
+        found, distance = cell_list.neighbors(pos, 2.0)
+        delta = xyz - pos
+        delta = delta - box_lengths*np.round(delta/box_lengths)
+        expected = np.nonzero(np.linalg.norm(delta, axis=1) <= radii + 2.3)[0]
+        assert sorted(found.tolist()) == expected.tolist()
+
+def test_multi_resolution_compounds():
+    argon = mb.Compound(name='Ar', element='Ar', charge=0)
+    small = mb.clone(argon)
+    small.translate_to([1.0, 1.0, 1.0])
+    large = mb.Compound()
+    for pos in [[4.0, 4.0, 4.0], [6.0, 4.0, 4.0]]:
+        temp = mb.clone(argon)
+        temp.translate_to(pos)
+        large.add(temp)
+
+    cell_list = mbcl.MultiResolutionCellList([10.0, 10.0, 10.0], r_cut=0.5, level_radii=[0.1, 1.0])
+    ids = cell_list.insert_compounds([small, large])
+    assert cell_list.member_levels.tolist() == [0, 1]
+    assert np.allclose(cell_list.radii, [0.0, 1.0])
+    assert cell_list.get_members(ids) == [small, large]
+    assert len(cell_list.contacts()[0]) == 0
+
+    # the small compound touches the large one once it is within the cutoff of its bounding sphere
+    small.translate_to([15.0, 5.4, 4.0])
+    cell_list.insert_compounds([small], wrap_pbc=True)
+    i, j, distance = cell_list.contacts()
+    assert (i.tolist(), j.tolist()) == ([2], [1])
+    assert np.allclose(distance, 1.4)
@@ -0,0 +1,45 @@
+"""
+Unit and regression test for the parallel pair search.
+"""
+
+import pytest
+
+import mbuild_cell_list as mbcl
+import numpy as np
+from mbuild_cell_list.parallel import _split_cells
+
+
+@pytest.mark.parametrize('list_type', ['full', 'half'])
+def test_parallel_pairs_within(list_type):
+    rng = np.random.default_rng(12345)
+    box_lengths = np.array([4.0, 5.0, 6.0])
+    xyz = rng.random((2000, 3))*box_lengths
+    cell_list = mbcl.CellList.from_cutoff(box_lengths.tolist(), r_cut=0.5, periodicity=[True, False, True],
+                                          list_type=list_type)
+    cell_list.insert_members(range(len(xyz)), xyz)
+
+    expected = cell_list.pairs_within(0.5, return_vectors=True)
+    result = mbcl.parallel_pairs_within(cell_list, 0.5, n_workers=2, return_vectors=True)
+
+    # the results are identical to the serial version, including the order
+    assert len(result) == 4
+    for expected_array, array in zip(expected, result):
+        assert np.array_equal(expected_array, array)
+
+    i, j, distance = mbcl.parallel_pairs_within(cell_list, 0.4, n_workers=2, n_blocks=3)
+    assert np.array_equal(i, cell_list.pairs_within(0.4)[0])
+
+    with pytest.raises(Exception):
+        mbcl.parallel_pairs_within(cell_list, 1.0, n_workers=2)
+
+def test_parallel_pairs_within_empty():
+    cell_list = mbcl.CellList(box=[3.0, 3.0, 3.0], n_cells=[3, 3, 3])
+    i, j, distance = mbcl.parallel_pairs_within(cell_list, 0.5, n_workers=2)
+    assert len(i) == len(j) == len(distance) == 0
+
+def test_split_cells():
+    cell_count = np.array([0, 5, 5, 0, 10, 0, 1, 1, 8])
+    blocks = _split_cells(cell_count, 3)
+    assert np.array_equal(np.concatenate(blocks), np.nonzero(cell_count)[0])
+    assert all(len(block) for block in blocks)
+    assert len(_split_cells(np.zeros(5, dtype=int), 3)) == 0
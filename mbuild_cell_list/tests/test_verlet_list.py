@@ -0,0 +1,76 @@
+"""
+Unit and regression test for the VerletList.
+"""
+
+import pytest
+
+import mbuild_cell_list as mbcl
+import numpy as np
+
+
+def brute_force_pairs(xyz, box_lengths, r_cut):
+    delta = xyz[None, :, :] - xyz[:, None, :]
+    delta = delta - box_lengths*np.round(delta/box_lengths)
+    distance = np.linalg.norm(delta, axis=2)
+    a, b = np.nonzero((distance <= r_cut) & ~np.eye(len(xyz), dtype=bool))
+    return set(zip(a.tolist(), b.tolist()))
+
+def test_verlet_list_build():
+    rng = np.random.default_rng(12345)
+    box_lengths = np.array([3.0, 3.0, 3.0])
+    xyz = rng.random((150, 3))*box_lengths
+    cell_list = mbcl.CellList(box=box_lengths.tolist(), n_cells=[3,3,3])
+    cell_list.insert_members(range(len(xyz)), xyz)
+
+    verlet_list = mbcl.VerletList(cell_list, r_cut=0.7, skin=0.2)
+    assert verlet_list.n_builds == 1
+    assert verlet_list.build_steps == [0]
+
+    i, j, distance = verlet_list.pairs_within()
+    assert set(zip(i.tolist(), j.tolist())) == brute_force_pairs(xyz, box_lengths, 0.7)
+    assert verlet_list.n_pairs == len(brute_force_pairs(xyz, box_lengths, 0.9))
+
+    for member in range(len(xyz)):
+        expected = {b for a, b in brute_force_pairs(xyz, box_lengths, 0.9) if a == member}
+        assert set(verlet_list.neighbors(member).tolist()) == expected
+
+    with pytest.raises(Exception):
+        verlet_list.pairs_within(1.0)
+
+    # the cells must be large enough to hold r_cut + skin
+    with pytest.raises(Exception):
+        mbcl.VerletList(cell_list, r_cut=0.9, skin=0.2)
+
+def test_verlet_list_update():
+    rng = np.random.default_rng(12345)
+    box_lengths = np.array([3.0, 3.0, 3.0])
+    xyz = rng.random((150, 3))*box_lengths
+    cell_list = mbcl.CellList(box=box_lengths.tolist(), n_cells=[3,3,3])
+    cell_list.insert_members(range(len(xyz)), xyz)
+    verlet_list = mbcl.VerletList(cell_list, r_cut=0.7, skin=0.2)
+
+    n_rebuilds = 0
+    for step in range(20):
+        xyz = xyz + rng.normal(0, 0.02, xyz.shape)
+        rebuilt = verlet_list.update(xyz, wrap_pbc=True)
+        n_rebuilds += rebuilt
+        if rebuilt:
+            assert verlet_list.max_displacement == 0.0
+        else:
+            assert verlet_list.max_displacement <= 0.1
+
+        # the pairs within r_cut are always correct, even without rebuilding
+        i, j, distance = verlet_list.pairs_within()
+        assert set(zip(i.tolist(), j.tolist())) == brute_force_pairs(xyz, box_lengths, 0.7)
+
+    assert verlet_list.n_updates == 20
+    assert verlet_list.n_builds == n_rebuilds + 1
+    assert 0 < n_rebuilds < 20
+    assert len(verlet_list.trigger_displacements) == n_rebuilds
+    assert all(displacement > 0.1 for displacement in verlet_list.trigger_displacements)
+    assert verlet_list.mean_steps_between_builds > 1
+
+    # like CellList, positions are not wrapped unless requested
+    xyz[0] = box_lengths + 0.5
+    with pytest.raises(Exception):
+        verlet_list.update(xyz)
@@ -0,0 +1,209 @@
+"""Verlet neighbor list with a skin distance, built on top of a CellList."""
+
+
+__all__ = ["VerletList"]
+
+import numpy as np
+
+
+class VerletList():
+    """Verlet neighbor list built from a CellList.
+    Each member stores the neighbors within r_cut + skin. As long as no member has moved
+    more than skin/2 since the last build, no pair within r_cut can be missing from the list,
+    so repeated evaluations only need to check the stored neighbors. The list is rebuilt
+    automatically when this is no longer the case.
+    """
+    def __init__(self, cell_list, r_cut, skin=0.1):
+        """Initialize the Verlet list and build it from the current contents of the cell list.
+
+        Parameters
+        ----------
+        cell_list : CellList
+            A populated cell list; the cells must be at least r_cut + skin in size.
+        r_cut : float
+            The interaction cutoff.
+        skin : float, default=0.1
+            The extra distance beyond r_cut to include in the list of neighbors.
+
+        Returns
+        ------
+        """
+        if r_cut + skin > cell_list.cell_widths.min():
+            raise Exception(f'r_cut + skin ({r_cut + skin}) cannot be larger than the size of the cells: '
+                            f'{cell_list.cell_widths}')
+        self._cell_list = cell_list
+        self._r_cut = r_cut
+        self._skin = skin
+
+        self._n_builds = 0
+        self._n_updates = 0
+        self._build_steps = []
+        self._trigger_displacements = []
+        self._max_displacement = 0.0
+        self._build()
+
+    def _build(self):
+        # find all pairs within r_cut + skin and store them sorted by the first member of the pair
+        i, j, _ = self._cell_list.pairs_within(self._r_cut + self._skin)
+        order = np.argsort(i, kind='stable')
+        self._i = i[order]
+        self._j = j[order]
+        self._neighbor_count = np.bincount(self._i, minlength=len(self._cell_list.xyz))
+        self._neighbor_start = np.cumsum(self._neighbor_count) - self._neighbor_count
+
+        self._xyz = np.array(self._cell_list.xyz)
+        self._xyz_at_build = np.array(self._xyz)
+        self._max_displacement = 0.0
+        self._n_builds += 1
+        self._build_steps.append(self._n_updates)
+
+    def build(self, xyz=None, wrap_pbc=False):
+        """Force the list to be rebuilt.
+
+        Parameters
+        ----------
+        xyz : np.ndarray, shape=(n_members,3), dtype=float, optional
+            New positions of the members; if not given, the current positions in the cell list are used.
+        wrap_pbc : bool, default=False
+            If True, positions outside of the box bounds will be wrapped to the other side based on defined
+            periodicity.
+
+        Returns
+        ------
+        """
+        if xyz is not None:
+            self._cell_list.update_positions(xyz, wrap_pbc=wrap_pbc)
+        self._build()
+
+    def update(self, xyz, wrap_pbc=False):
+        """Update the positions of the members, rebuilding the list only if needed.
+        The list is rebuilt when the largest displacement of any member since the last build exceeds skin/2.
+
+        Parameters
+        ----------
+        xyz : np.ndarray, shape=(n_members,3), dtype=float
+            The new position of each member, in member id order.
+        wrap_pbc : bool, default=False
+            If True, positions outside of the box bounds will be wrapped to the other side based on defined
+            periodicity.
+
+        Returns
+        ------
+        rebuilt : bool
+            True if the list was rebuilt.
+        """
+        xyz = np.array(xyz, dtype=float).reshape(-1, 3)
+        if len(xyz) != len(self._xyz):
+            raise Exception(f'Number of positions ({len(xyz)}) does not match number of members ({len(self._xyz)}).')
+        self._n_updates += 1
+
+        displacement = np.linalg.norm(self._cell_list._minimum_image(xyz - self._xyz_at_build), axis=1)
+        self._max_displacement = displacement.max() if len(displacement) else 0.0
+        if self._max_displacement > self._skin/2.0:
+            self._trigger_displacements.append(self._max_displacement)
+            self.build(xyz, wrap_pbc=wrap_pbc)
+            return True
+
+        self._xyz = xyz
+        return False
+
+    def neighbors(self, i):
+        """Returns the neighbors of a member, i.e., all members within r_cut + skin at the last build.
+        With a 'half' cell list, each pair is only stored for one of the two members.
+
+        Parameters
+        ----------
+        i : int
+            The member id of interest.
+
+        Returns
+        ------
+        neighbors : np.ndarray, dtype=int
+            The member ids of the neighbors.
+        """
+        start = self._neighbor_start[i]
+        return self._j[start:start+self._neighbor_count[i]]
+
+    def pairs_within(self, r_cut=None, return_vectors=False):
+        """Find the pairs within a cutoff using the current positions, checking only the stored neighbors.
+
+        Parameters
+        ----------
+        r_cut : float, optional
+            The cutoff distance, which cannot be larger than r_cut + skin. Defaults to the r_cut of the list.
+        return_vectors : bool, default=False
+            If True, also return the minimum image displacement vector from member i to member j.
+
+        Returns
+        ------
+        i : np.ndarray, shape=(n_pairs), dtype=int
+            The member id of the first member of each pair.
+        j : np.ndarray, shape=(n_pairs), dtype=int
+            The member id of the second member of each pair.
+        distance : np.ndarray, shape=(n_pairs), dtype=float
+            The distance between the members of each pair.
+        vectors : np.ndarray, shape=(n_pairs, 3), dtype=float
+            The displacement from member i to member j; only returned if return_vectors is True.
+        """
+        if r_cut is None:
+            r_cut = self._r_cut
+        if r_cut > self._r_cut + self._skin:
+            raise Exception(f'The cutoff ({r_cut}) cannot be larger than r_cut + skin ({self._r_cut + self._skin}).')
+        vectors = self._cell_list._minimum_image(self._xyz[self._j] - self._xyz[self._i])
+        distance = np.linalg.norm(vectors, axis=1)
+        within = distance <= r_cut
+        if return_vectors:
+            return self._i[within], self._j[within], distance[within], vectors[within]
+        return self._i[within], self._j[within], distance[within]
+
+    @property
+    def r_cut(self):
+        """Returns the interaction cutoff."""
+        return self._r_cut
+
+    @property
+    def skin(self):
+        """Returns the skin distance."""
+        return self._skin
+
+    @property
+    def n_pairs(self):
+        """Returns the number of stored neighbor pairs."""
+        return len(self._i)
+
+    @property
+    def n_builds(self):
+        """Returns the number of times the list has been built."""
+        return self._n_builds
+
+    @property
+    def n_updates(self):
+        """Returns the number of times update has been called."""
+        return self._n_updates
+
+    @property
+    def max_displacement(self):
+        """Returns the largest displacement of any member since the last build."""
+        return self._max_displacement
+
+    @property
+    def build_steps(self):
+        """Returns the update step at which each build occurred (0 for the initial build)."""
+        return list(self._build_steps)
+
+    @property
+    def trigger_displacements(self):
+        """Returns the maximum displacement that triggered each automatic rebuild."""
+        return list(self._trigger_displacements)
+
+    @property
+    def mean_steps_between_builds(self):
+        """Returns the average number of updates between builds, which can be used to tune the skin.
+        Returns
+        ------
+        mean_steps : float
+            The average number of updates between consecutive builds, or nan if there has been only one build.
+        """
+        if len(self._build_steps) < 2:
+            return float('nan')
+        return float(np.mean(np.diff(self._build_steps)))